@@ -206,6 +206,13 @@ async def reindex_document(
     )
 
 
+@router.post("/index/rebuild")
+async def rebuild_index():
+    """Rebuild the vector index with the configured HNSW parameters"""
+    copied = await rag_service.rebuild_collection()
+    return {"success": True, "chunks_copied": copied}
+
+
 @router.get("/stats/overview")
 async def get_document_stats(db: AsyncSession = Depends(get_db)):
     """Get document statistics"""
@@ -223,7 +230,7 @@ async def get_document_stats(db: AsyncSession = Depends(get_db)):
         total_size += doc.size_bytes
         total_chunks += doc.chunk_count
 
-    rag_stats = rag_service.get_stats()
+    rag_stats = await rag_service.get_stats()
 
     return {
         "total_documents": len(documents),
@@ -1,9 +1,10 @@
 """Memory API endpoints"""
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
-from ..core.database import get_db
+from ..core.database import get_db, async_session_maker
 from ..models.schemas import (
     MemoryCreate, MemoryUpdate, MemoryResponse,
     MemorySearch, MemoryType, UserProfile
@@ -90,9 +91,19 @@ async def get_timeline(
 
 
 @router.get("/export")
-async def export_memories(db: AsyncSession = Depends(get_db)):
-    """Export all memories as JSON"""
-    return await memory_service.export_all(db)
+async def export_memories():
+    """Export all memories as newline-delimited JSON"""
+    async def generate():
+        # The session has to outlive the request handler, so open it here
+        async with async_session_maker() as db:
+            async for line in memory_service.export_ndjson(db):
+                yield line
+
+    return StreamingResponse(
+        generate(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": "attachment; filename=memories.ndjson"}
+    )
 
 
 @router.get("/{memory_id}", response_model=MemoryResponse)
@@ -1,7 +1,9 @@
 """Projects API endpoints"""
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
+import json
 
 from ..core.database import get_db
 from ..models.schemas import (
@@ -157,6 +159,31 @@ async def iterate_on_project(
     return result
 
 
+@router.post("/{project_id}/iterate/stream")
+async def iterate_on_project_stream(
+    project_id: str,
+    data: ProjectIteration,
+    db: AsyncSession = Depends(get_db)
+):
+    """Stream an AI iteration on a project"""
+    async def generate():
+        try:
+            async for chunk in project_service.iterate_on_project_stream(
+                db=db,
+                project_id=project_id,
+                message=data.message,
+                include_documents=data.include_documents
+            ):
+                yield f"data: {json.dumps(chunk)}\n\n"
+        except Exception as e:
+            yield f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream"
+    )
+
+
 @router.get("/{project_id}/iterations")
 async def get_project_iterations(
     project_id: str,
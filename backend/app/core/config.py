@@ -57,6 +57,13 @@ class Settings(BaseSettings):
     CHUNK_OVERLAP: int = 200
     TOP_K_RESULTS: int = 5
 
+    # HNSW graph parameters for newly created ChromaDB collections
+    HNSW_M: int = 24
+    HNSW_CONSTRUCTION_EF: int = 128
+    HNSW_SEARCH_EF: int = 100
+    HNSW_BATCH_SIZE: int = 250
+    HNSW_SYNC_THRESHOLD: int = 2000
+
     # Watch folders (user configurable)
     WATCH_FOLDERS: List[str] = []
 
@@ -1,4 +1,6 @@
 """Database setup and session management"""
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 from .config import settings
@@ -16,6 +18,38 @@ engine = create_async_engine(
     future=True
 )
 
+# Trigram FTS5 index over memories.content, kept in sync by triggers, so
+# substring searches on memories don't have to scan the whole table. Rows
+# are keyed by memories.id: memories has no INTEGER PRIMARY KEY, so its
+# implicit rowid can be renumbered by VACUUM.
+_MEMORY_FTS_DDL = [
+    "CREATE VIRTUAL TABLE memories_fts USING fts5("
+    "id UNINDEXED, content, tokenize='trigram')",
+    "CREATE TRIGGER memories_fts_ai AFTER INSERT ON memories BEGIN "
+    "INSERT INTO memories_fts(id, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER memories_fts_ad AFTER DELETE ON memories BEGIN "
+    "DELETE FROM memories_fts WHERE id = old.id; END",
+    "CREATE TRIGGER memories_fts_au AFTER UPDATE OF id, content ON memories BEGIN "
+    "DELETE FROM memories_fts WHERE id = old.id; "
+    "INSERT INTO memories_fts(id, content) VALUES (new.id, new.content); END",
+    "INSERT INTO memories_fts(id, content) SELECT id, content FROM memories",
+]
+
+# Earlier rowid-keyed (external content) version of the index
+_OLD_MEMORY_FTS_DROP = [
+    "DROP TRIGGER IF EXISTS memories_fts_ai",
+    "DROP TRIGGER IF EXISTS memories_fts_ad",
+    "DROP TRIGGER IF EXISTS memories_fts_au",
+    "DROP TABLE IF EXISTS memories_fts",
+]
+
+_memory_fts_enabled = False
+
+# Indexes removed from the models that older databases may still carry
+_DROPPED_INDEXES = [
+    "idx_modelusage_task",  # covered by idx_modelusage_task_override_created
+]
+
 # Session factory
 async_session_maker = async_sessionmaker(
     engine,
@@ -41,6 +75,49 @@ async def init_db():
     """Initialize database tables"""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_create_missing_indexes)
+        for name in _DROPPED_INDEXES:
+            await conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+    await _init_memory_fts()
+
+
+def _create_missing_indexes(sync_conn):
+    """Create indexes added to models after their table already existed"""
+    # create_all skips existing tables, and their new indexes with them
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+
+async def _init_memory_fts():
+    """Create the memory content search index on SQLite builds with FTS5 trigram support"""
+    global _memory_fts_enabled
+
+    if engine.dialect.name != "sqlite":
+        return
+
+    try:
+        async with engine.begin() as conn:
+            result = await conn.execute(text(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'memories_fts'"
+            ))
+            existing = result.scalar()
+            if existing is not None and "content='memories'" in existing:
+                for statement in _OLD_MEMORY_FTS_DROP:
+                    await conn.execute(text(statement))
+                existing = None
+            if existing is None:
+                for statement in _MEMORY_FTS_DDL:
+                    await conn.execute(text(statement))
+        _memory_fts_enabled = True
+    except OperationalError as e:
+        print(f"Memory search index unavailable, falling back to LIKE scans: {e}")
+
+
+def memory_fts_enabled() -> bool:
+    """Whether the memories_fts trigram index can be used for content search"""
+    return _memory_fts_enabled
 
 
 async def close_db():
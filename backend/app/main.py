@@ -12,6 +12,7 @@ from .services.memory_service import memory_service
 from .services.file_watcher import file_watcher
 from .services.rag_service import rag_service
 from .services.ollama_service import ollama_service
+from .services.encryption_service import encryption_service
 
 # Import API routers
 from .api import chat, documents, memory, projects, writing, webcapture, settings as settings_api, backup
@@ -36,6 +37,14 @@ async def lifespan(app: FastAPI):
         await memory_service.initialize_default_profile(db)
         print("User profile initialized")
 
+        # Finish chunk deletes interrupted by the last shutdown
+        pending = await rag_service.collect_pending_garbage(db)
+        if pending:
+            print(f"Removing chunks for {pending} deleted documents")
+
+    # Load the context tokenizer off the event loop
+    await rag_service.load_token_encoder()
+
     # Check Ollama connection
     print("Checking Ollama connection...")
     ollama_ok = await ollama_service.check_health()
@@ -74,6 +83,9 @@ async def lifespan(app: FastAPI):
     # Shutdown
     print("\nShutting down...")
     file_watcher.stop()
+    rag_service.close()
+    encryption_service.close()
+    await ollama_service.aclose()
     await close_db()
     print("Goodbye!")
 
@@ -1,7 +1,7 @@
 """SQLAlchemy database models"""
 from sqlalchemy import (
-    Column, String, Text, Integer, Float, Boolean, DateTime, JSON,
-    ForeignKey, Enum as SQLEnum, Index
+    Column, String, Text, Integer, Float, Boolean, DateTime, JSON, LargeBinary,
+    ForeignKey, Enum as SQLEnum, Index, func
 )
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -99,6 +99,24 @@ class DocumentChunk(Base):
     )
 
 
+class EmbeddingCache(Base):
+    """Chunk embeddings keyed by content hash, reused across re-indexing"""
+    __tablename__ = "embedding_cache"
+
+    hash = Column(String(64), primary_key=True)  # sha256 of the chunk text
+    model = Column(String(100), primary_key=True)
+    vector = Column(LargeBinary, nullable=False)  # float32 array bytes
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class PendingGC(Base):
+    """Deleted documents whose ChromaDB chunks have not been removed yet"""
+    __tablename__ = "pending_gc"
+
+    document_id = Column(String(36), primary_key=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
 class Project(Base):
     """Project/task tracker"""
     __tablename__ = "projects"
@@ -112,7 +130,7 @@ class Project(Base):
     notes = Column(Text)
     related_documents = Column(JSON, default=list)
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=func.now())
     is_archived = Column(Boolean, default=False)
 
     # Relationships
@@ -122,6 +140,9 @@ class Project(Base):
         Index("idx_projects_status", "status"),
     )
 
+    # Fetch the DB-side updated_at on flush instead of expiring it
+    __mapper_args__ = {"eager_defaults": True}
+
 
 class ProjectIteration(Base):
     """Project iteration/conversation"""
@@ -138,6 +159,10 @@ class ProjectIteration(Base):
     # Relationships
     project = relationship("Project", back_populates="iterations")
 
+    __table_args__ = (
+        Index("idx_iterations_project_created", "project_id", "created_at"),
+    )
+
 
 class Memory(Base):
     """Persistent memory/knowledge about user"""
@@ -160,6 +185,15 @@ class Memory(Base):
         Index("idx_memories_type", "memory_type"),
         Index("idx_memories_category", "category"),
         Index("idx_memories_confidence", "confidence"),
+        # Partial indexes for the live (not soft-deleted) rows every query targets
+        Index(
+            "idx_memories_live_type_conf", memory_type, confidence.desc(),
+            sqlite_where=is_deleted == False, postgresql_where=is_deleted == False
+        ),
+        Index(
+            "idx_memories_live_created", created_at.desc(),
+            sqlite_where=is_deleted == False, postgresql_where=is_deleted == False
+        ),
     )
 
 
@@ -227,5 +261,5 @@ class ModelUsageLog(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
     __table_args__ = (
-        Index("idx_modelusage_task", "task_type"),
+        Index("idx_modelusage_task_override_created", "task_type", "was_override", "created_at"),
     )
@@ -97,7 +97,7 @@ class BackupService:
             # Encrypt if requested
             if encrypt:
                 from .encryption_service import encryption_service
-                encrypted_path = encryption_service.encrypt_file(backup_path)
+                encrypted_path = await encryption_service.encrypt_file_async(backup_path)
                 backup_path.unlink()
                 backup_path = encrypted_path
 
@@ -265,7 +265,7 @@ class BackupService:
             # Check if encrypted
             if backup_path.suffix == ".encrypted":
                 from .encryption_service import encryption_service
-                backup_path = encryption_service.decrypt_file(backup_path, temp_dir / "backup.zip")
+                backup_path = await encryption_service.decrypt_file_async(backup_path, temp_dir / "backup.zip")
 
             # Extract backup
             with zipfile.ZipFile(backup_path, 'r') as zipf:
@@ -1,15 +1,182 @@
 """Document processing and text extraction with OCR support"""
 import os
 import io
+import codecs
+import re
+import hashlib
+import functools
+import threading
 from pathlib import Path
 from typing import Dict, Any, Optional, List
 import asyncio
 from datetime import datetime
 
-# Document processing libraries
-import markdown
-from bs4 import BeautifulSoup
-import html2text
+# Parsing and OCR backends are imported where they are used so that
+# importing this module (and starting the server) stays cheap
+
+# Collapses each run of blank lines (and the whitespace around them) in one pass
+_WS_RE = re.compile(r'\s*\n\s*')
+
+# First level-one Markdown heading
+_MD_TITLE_RE = re.compile(r'^# (.+)$', re.MULTILINE)
+
+# Bytes that commonly appear in text files, used to sniff binary content
+_TEXTCHARS = bytes({7, 8, 9, 10, 12, 13, 27} | set(range(0x20, 0x100)) - {0x7f})
+
+# Upper bound on the longest side of an image upscaled for OCR
+_OCR_MAX_DIMENSION = 6000
+
+# Shared tesserocr API; keeps the language model resident between calls.
+# The API is not thread-safe, so every use goes through _tess_lock.
+_tess_api = None
+_tess_lock = threading.Lock()
+
+# OCR results keyed by image pixel hash, opened on first use
+_ocr_cache = None
+
+
+def _count_lines(content: str) -> int:
+    """Count lines without splitting the content into a list"""
+    return content.count('\n') + 1
+
+
+def _read_head(path: Path, size: int = 8192) -> bytes:
+    """Read the first bytes of a file"""
+    with path.open('rb') as f:
+        return f.read(size)
+
+
+def _is_binary(head: bytes) -> bool:
+    """Guess whether a file prefix is binary rather than text"""
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return False
+    if b'\x00' in head:
+        return True
+    return len(head.translate(None, _TEXTCHARS)) > len(head) * 0.3
+
+
+def _extract_epub_item(item) -> str:
+    """Extract plain text from a single EPUB document item"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(item.get_content(), 'html.parser')
+    return soup.get_text(separator='\n')
+
+
+def _preprocess_for_ocr(image, dpi: Optional[float] = None):
+    """Upscale, flatten, grayscale and denoise an image before running Tesseract"""
+    from PIL import Image
+
+    # Tesseract is most accurate at around 300 DPI
+    dpi = dpi or image.info.get('dpi', (72, 72))[0] or 72
+    if dpi < 300:
+        scale = min(300 / dpi, _OCR_MAX_DIMENSION / max(image.width, image.height))
+        if scale > 1:
+            image = image.resize(
+                (int(image.width * scale), int(image.height * scale)),
+                Image.LANCZOS
+            )
+
+    # Flatten transparency onto a white background
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        rgba = image.convert('RGBA')
+        background = Image.new('RGBA', rgba.size, (255, 255, 255, 255))
+        image = Image.alpha_composite(background, rgba)
+
+    image = image.convert('L')
+
+    # Edge-preserving denoise and binarization need OpenCV
+    try:
+        import cv2
+        import numpy as np
+    except ImportError:
+        return image
+
+    arr = cv2.bilateralFilter(np.array(image), d=5, sigmaColor=75, sigmaSpace=2)
+    _, arr = cv2.threshold(arr, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return Image.fromarray(arr)
+
+
+def _tesserocr_image_to_text(image, psm) -> str:
+    """Run OCR with the shared tesserocr API, loading it on first use"""
+    global _tess_api
+    from tesserocr import PyTessBaseAPI
+
+    with _tess_lock:
+        if _tess_api is None:
+            _tess_api = PyTessBaseAPI(lang='eng')
+        _tess_api.SetPageSegMode(psm)
+        _tess_api.SetImage(image)
+        return _tess_api.GetUTF8Text()
+
+
+def _ocr_image(image, sparse: bool = False, dpi: Optional[float] = None) -> str:
+    """Preprocess and OCR an image, preferring tesserocr over spawning the tesseract CLI"""
+    image = _preprocess_for_ocr(image, dpi=dpi)
+    try:
+        from tesserocr import PSM
+    except ImportError:
+        import pytesseract
+        config = '--psm 11' if sparse else ''
+        return pytesseract.image_to_string(image, config=config)
+
+    return _tesserocr_image_to_text(image, PSM.SPARSE_TEXT if sparse else PSM.AUTO)
+
+
+def _get_ocr_cache():
+    """Get the on-disk OCR result cache, or None if diskcache isn't installed"""
+    global _ocr_cache
+    if _ocr_cache is None:
+        try:
+            import diskcache
+        except ImportError:
+            return None
+        from ..core.config import settings
+        _ocr_cache = diskcache.Cache(str(settings.DATA_DIR / "ocr_cache"))
+    return _ocr_cache
+
+
+def _image_hash(image) -> str:
+    """Hash an image's pixels so identical images share OCR results"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{image.mode}:{image.width}x{image.height}".encode())
+    h.update(image.tobytes())
+    return h.hexdigest()
+
+
+async def _cached_ocr(image, sparse: bool = False, dpi: Optional[float] = None) -> str:
+    """Preprocess and OCR an image, skipping Tesseract for images seen before"""
+    # Hashing, cache I/O, preprocessing and Tesseract all block, so each
+    # step runs in a worker thread rather than on the event loop
+    cache = await asyncio.to_thread(_get_ocr_cache)
+    if cache is None:
+        return await asyncio.to_thread(_ocr_image, image, sparse, dpi)
+
+    key = f"{'sparse' if sparse else 'auto'}:{await asyncio.to_thread(_image_hash, image)}"
+
+    text = await asyncio.to_thread(cache.get, key)
+    if text is None:
+        text = await asyncio.to_thread(_ocr_image, image, sparse, dpi)
+        await asyncio.to_thread(cache.set, key, text)
+    return text
+
+
+def _render_pdf_page(pdf_path: Path, page_num: int, dpi: int):
+    """Render a single PDF page to a PIL image in memory"""
+    import fitz
+    from PIL import Image
+
+    with fitz.open(str(pdf_path)) as doc:
+        pix = doc[page_num].get_pixmap(dpi=dpi)
+        return Image.frombytes('RGB', (pix.width, pix.height), pix.samples)
+
+
+def _extract_slide_text(slide) -> List[str]:
+    """Extract the text of every non-empty shape on a slide"""
+    return [
+        shape.text for shape in slide.shapes
+        if hasattr(shape, "text") and shape.text.strip()
+    ]
 
 
 class DocumentProcessor:
@@ -79,23 +246,42 @@ class DocumentProcessor:
     # OCR available flag
     _ocr_available: Optional[bool] = None
 
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def _lookup_file_type(ext: str) -> str:
+        """Map a lowercased extension to its file type category"""
+        return DocumentProcessor.SUPPORTED_EXTENSIONS.get(ext, 'unknown')
+
     def __init__(self):
-        self.html_converter = html2text.HTML2Text()
-        self.html_converter.ignore_links = False
-        self.html_converter.ignore_images = True
-        self.html_converter.body_width = 0
-        self._check_ocr_availability()
+        # HTML2Text keeps per-document state, so each thread gets its own
+        self._tls = threading.local()
+
+    @property
+    def html_converter(self):
+        """Get the HTML to markdown converter for the current thread"""
+        converter = getattr(self._tls, 'html_converter', None)
+        if converter is None:
+            import html2text
+            converter = html2text.HTML2Text()
+            converter.ignore_links = False
+            converter.ignore_images = True
+            converter.body_width = 0
+            self._tls.html_converter = converter
+        return converter
 
     def _check_ocr_availability(self):
         """Check if OCR libraries are available"""
         if self._ocr_available is None:
             try:
-                import pytesseract
                 from PIL import Image
+                try:
+                    import tesserocr
+                except ImportError:
+                    import pytesseract
                 self._ocr_available = True
             except ImportError:
                 self._ocr_available = False
-                print("OCR not available. Install pytesseract and Pillow for image text extraction.")
+                print("OCR not available. Install tesserocr (or pytesseract) and Pillow for image text extraction.")
 
     @property
     def ocr_available(self) -> bool:
@@ -115,9 +301,14 @@ class DocumentProcessor:
             - metadata: additional metadata
         """
         ext = path.suffix.lower()
-        file_type = self.SUPPORTED_EXTENSIONS.get(ext, 'unknown')
+        file_type = self._lookup_file_type(ext)
 
         if file_type == 'unknown':
+            # Fail fast on binary files rather than decoding the whole thing
+            head = await asyncio.to_thread(_read_head, path)
+            if _is_binary(head):
+                raise ValueError(f"Unsupported file type: {ext}")
+
             # Try to read as text anyway
             try:
                 content = await self._read_text_file(path)
@@ -151,15 +342,18 @@ class DocumentProcessor:
 
     async def _read_text_file(self, path: Path) -> str:
         """Read a text file with encoding detection"""
-        encodings = ['utf-8', 'utf-16', 'latin-1', 'cp1252']
+        data = await asyncio.to_thread(path.read_bytes)
 
-        for encoding in encodings:
-            try:
-                return path.read_text(encoding=encoding)
-            except (UnicodeDecodeError, LookupError):
-                continue
+        try:
+            return data.decode('utf-8')
+        except UnicodeDecodeError:
+            pass
 
-        raise ValueError(f"Could not decode file: {path}")
+        # Detect the encoding from a prefix instead of re-reading the file per guess
+        from charset_normalizer import from_bytes
+        best = from_bytes(data[:65536]).best()
+        encoding = best.encoding if best else 'latin-1'
+        return data.decode(encoding, errors='replace')
 
     async def _process_text(self, path: Path) -> Dict[str, Any]:
         """Process plain text file"""
@@ -176,14 +370,11 @@ class DocumentProcessor:
         content = await self._read_text_file(path)
 
         # Extract title from first heading if present
-        title = path.stem
-        lines = content.split('\n')
-        for line in lines:
-            if line.startswith('# '):
-                title = line[2:].strip()
-                break
+        match = _MD_TITLE_RE.search(content)
+        title = match.group(1).strip() if match else path.stem
 
         # Convert to HTML then to plain text for better chunking
+        import markdown
         html = markdown.markdown(content)
         plain_text = self.html_converter.handle(html)
 
@@ -194,8 +385,10 @@ class DocumentProcessor:
             'metadata': {'has_frontmatter': content.startswith('---')}
         }
 
-    async def _process_html(self, path: Path) -> Dict[str, Any]:
+    async def _process_html(self, path: Path, preserve_markdown: bool = False) -> Dict[str, Any]:
         """Process HTML file"""
+        from bs4 import BeautifulSoup
+
         content = await self._read_text_file(path)
         soup = BeautifulSoup(content, 'html.parser')
 
@@ -212,7 +405,12 @@ class DocumentProcessor:
         # Get main content
         main_content = soup.find('main') or soup.find('article') or soup.find('body') or soup
 
-        plain_text = self.html_converter.handle(str(main_content))
+        # Markdown conversion re-serializes and re-parses the subtree, so only
+        # do it when the structure is actually wanted
+        if preserve_markdown:
+            plain_text = self.html_converter.handle(str(main_content))
+        else:
+            plain_text = main_content.get_text('\n', strip=True)
 
         return {
             'content': plain_text,
@@ -292,7 +490,7 @@ class DocumentProcessor:
             'title': path.name,
             'metadata': {
                 'language': path.suffix[1:],
-                'line_count': len(content.split('\n'))
+                'line_count': _count_lines(content)
             }
         }
 
@@ -306,40 +504,50 @@ class DocumentProcessor:
             'file_type': 'data',
             'title': path.name,
             'metadata': {
-                'row_count': len(content.split('\n')),
+                'row_count': _count_lines(content),
                 'format': path.suffix[1:]
             }
         }
 
-    def process_web_content(self, html: str, url: str, title: Optional[str] = None) -> Dict[str, Any]:
+    def process_web_content(
+        self,
+        html: str,
+        url: str,
+        title: Optional[str] = None,
+        preserve_markdown: bool = False
+    ) -> Dict[str, Any]:
         """Process captured web content"""
-        soup = BeautifulSoup(html, 'html.parser')
+        from selectolax.parser import HTMLParser
+
+        tree = HTMLParser(html)
 
         # Extract title
         if not title:
-            title_tag = soup.find('title')
-            title = title_tag.get_text().strip() if title_tag else url
+            title_tag = tree.css_first('title')
+            title = title_tag.text().strip() if title_tag else url
 
         # Remove unwanted elements
-        for element in soup(['script', 'style', 'nav', 'footer', 'header',
-                           'aside', 'iframe', 'noscript', 'form']):
-            element.decompose()
+        for selector in ('script', 'style', 'nav', 'footer', 'header',
+                         'aside', 'iframe', 'noscript', 'form'):
+            for node in tree.css(selector):
+                node.decompose()
 
         # Try to find main content area
         main_content = (
-            soup.find('article') or
-            soup.find('main') or
-            soup.find(class_=['content', 'article', 'post', 'entry']) or
-            soup.find('body') or
-            soup
+            tree.css_first('article') or
+            tree.css_first('main') or
+            tree.css_first('.content, .article, .post, .entry') or
+            tree.body or
+            tree.root
         )
 
-        plain_text = self.html_converter.handle(str(main_content))
+        if preserve_markdown:
+            plain_text = self.html_converter.handle(main_content.html)
+        else:
+            plain_text = main_content.text(separator='\n', strip=True)
 
         # Clean up excessive whitespace
-        lines = [line.strip() for line in plain_text.split('\n')]
-        lines = [line for line in lines if line]
-        clean_text = '\n\n'.join(lines)
+        clean_text = _WS_RE.sub('\n\n', plain_text).strip()
 
         return {
             'content': clean_text,
@@ -353,22 +561,21 @@ class DocumentProcessor:
             import openpyxl
 
             wb = openpyxl.load_workbook(str(path), data_only=True)
-            content_parts = []
+            buf = io.StringIO()
 
             for sheet_name in wb.sheetnames:
                 sheet = wb[sheet_name]
-                content_parts.append(f"## Sheet: {sheet_name}\n")
+                buf.write(f"## Sheet: {sheet_name}\n\n")
 
-                rows = []
                 for row in sheet.iter_rows(values_only=True):
-                    row_text = '\t'.join([str(cell) if cell is not None else '' for cell in row])
+                    row_text = '\t'.join(str(cell) if cell is not None else '' for cell in row)
                     if row_text.strip():
-                        rows.append(row_text)
+                        buf.write(row_text)
+                        buf.write('\n')
 
-                content_parts.append('\n'.join(rows))
-                content_parts.append('\n')
+                buf.write('\n')
 
-            content = '\n'.join(content_parts)
+            content = buf.getvalue()
 
             return {
                 'content': content,
@@ -390,12 +597,14 @@ class DocumentProcessor:
             prs = Presentation(str(path))
             content_parts = []
 
-            for slide_num, slide in enumerate(prs.slides, 1):
-                content_parts.append(f"\n## Slide {slide_num}\n")
+            # Slides are independent, so extract them concurrently
+            slide_texts = await asyncio.gather(*(
+                asyncio.to_thread(_extract_slide_text, slide) for slide in prs.slides
+            ))
 
-                for shape in slide.shapes:
-                    if hasattr(shape, "text") and shape.text.strip():
-                        content_parts.append(shape.text)
+            for slide_num, texts in enumerate(slide_texts, 1):
+                content_parts.append(f"\n## Slide {slide_num}\n")
+                content_parts.extend(texts)
 
             content = '\n'.join(content_parts)
 
@@ -417,20 +626,18 @@ class DocumentProcessor:
             from ebooklib import epub
 
             book = epub.read_epub(str(path))
-            content_parts = []
 
             # Get title
             title = path.stem
             if book.get_metadata('DC', 'title'):
                 title = book.get_metadata('DC', 'title')[0][0]
 
-            # Extract text from all document items
-            for item in book.get_items():
-                if item.get_type() == ebooklib.ITEM_DOCUMENT:
-                    soup = BeautifulSoup(item.get_content(), 'html.parser')
-                    text = soup.get_text(separator='\n')
-                    if text.strip():
-                        content_parts.append(text)
+            # Extract text from all document items concurrently
+            items = [item for item in book.get_items() if item.get_type() == ebooklib.ITEM_DOCUMENT]
+            texts = await asyncio.gather(*(
+                asyncio.to_thread(_extract_epub_item, item) for item in items
+            ))
+            content_parts = [text for text in texts if text.strip()]
 
             content = '\n\n'.join(content_parts)
 
@@ -455,20 +662,19 @@ class DocumentProcessor:
         """Process image files using OCR"""
         if not self.ocr_available:
             return {
-                'content': f"[Image file: {path.name}. OCR not available - install pytesseract]",
+                'content': f"[Image file: {path.name}. OCR not available - install tesserocr or pytesseract]",
                 'file_type': 'image',
                 'title': path.stem,
                 'metadata': {'ocr_performed': False}
             }
 
         try:
-            import pytesseract
             from PIL import Image
 
             image = Image.open(str(path))
 
-            # Perform OCR
-            text = pytesseract.image_to_string(image)
+            # Perform OCR (standalone images tend to be sparse text, e.g. screenshots)
+            text = await _cached_ocr(image, sparse=True)
 
             return {
                 'content': text.strip() or "[No text detected in image]",
@@ -544,20 +750,9 @@ class DocumentProcessor:
     async def _ocr_pdf_page(self, pdf_path: Path, page_num: int) -> Optional[str]:
         """OCR a single PDF page"""
         try:
-            import pdf2image
-            import pytesseract
-
-            # Convert PDF page to image
-            images = pdf2image.convert_from_path(
-                str(pdf_path),
-                first_page=page_num + 1,
-                last_page=page_num + 1,
-                dpi=300
-            )
-
-            if images:
-                text = pytesseract.image_to_string(images[0])
-                return text.strip()
+            image = await asyncio.to_thread(_render_pdf_page, pdf_path, page_num, 300)
+            text = await _cached_ocr(image, dpi=300)
+            return text.strip()
         except Exception:
             pass
         return None
@@ -613,8 +808,7 @@ Summary:"""
 
     def get_file_type(self, path: Path) -> str:
         """Get the file type category for a path"""
-        ext = path.suffix.lower()
-        return self.SUPPORTED_EXTENSIONS.get(ext, 'unknown')
+        return self._lookup_file_type(path.suffix.lower())
 
 
 # Singleton instance
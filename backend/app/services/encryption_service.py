@@ -1,16 +1,113 @@
 """Encryption service for data at rest"""
 import os
+import mmap
+import asyncio
+import hmac
 import base64
 import hashlib
 import secrets
+import struct
+import multiprocessing
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Optional, Tuple, BinaryIO
+from concurrent.futures import ProcessPoolExecutor
 from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
 from ..core.config import settings
 
+# Leading byte of AES-GCM blobs: version || nonce || ciphertext+tag.
+# Fernet tokens are base64 text, so they never start with this byte.
+_AEAD_VERSION = b"\x01"
+_NONCE_SIZE = 12
+
+# Streamed file format: header (magic, version, chunk size, base nonce)
+# followed by one length-prefixed AES-GCM record per chunk. Each record
+# authenticates the header, its index and whether it is the last one, so
+# reordered or truncated files fail to decrypt.
+_FILE_MAGIC = b"NXEF"
+_FILE_VERSION = 1
+_FILE_HEADER = struct.Struct(">4sBI12s")
+_RECORD_LEN = struct.Struct(">I")
+_RECORD_AAD = struct.Struct(">Q?")
+_TAG_SIZE = 16
+_CHUNK_SIZE = 1024 * 1024
+
+# Salt files start with the id of the KDF used to derive the key. A bare
+# 16 byte salt predates the id and always means PBKDF2-SHA256.
+_KDF_PBKDF2 = 1
+_KDF_SCRYPT = 2
+_SALT_SIZE = 16
+
+# Files larger than this are encrypted/decrypted in a worker process by the
+# async helpers so the work doesn't contend with the server for the GIL
+_PROCESS_THRESHOLD = 16 * 1024 * 1024
+
+# Per-process service used by pool workers, keyed once by _init_worker
+_worker_service = None
+
+
+def _init_worker(key: bytes):
+    """Process pool initializer: load the parent's key into a local service"""
+    global _worker_service
+    _worker_service = EncryptionService()
+    _worker_service._load_key(key)
+
+
+def _worker_encrypt_file(input_path: Path, output_path: Optional[Path]) -> Path:
+    """Encrypt a file inside a pool worker"""
+    return _worker_service.encrypt_file(input_path, output_path)
+
+
+def _worker_decrypt_file(input_path: Path, output_path: Optional[Path]) -> Path:
+    """Decrypt a file inside a pool worker"""
+    return _worker_service.decrypt_file(input_path, output_path)
+
+
+def _write_all(fd: int, buffers: list):
+    """Write buffers to fd with a single writev, finishing any short write"""
+    written = os.writev(fd, buffers)
+    total = sum(len(b) for b in buffers)
+    if written < total:
+        remaining = memoryview(b"".join(buffers))[written:]
+        while remaining:
+            remaining = remaining[os.write(fd, remaining):]
+
+
+def _pbkdf2_sha256(password: bytes, salt: bytes, iterations: int, dklen: int) -> bytes:
+    """Pure-Python PBKDF2-HMAC-SHA256 for interpreters built without hashlib.pbkdf2_hmac"""
+    # Key the inner and outer hashes once and copy them per iteration, and
+    # fold each block with integer XOR rather than byte-by-byte
+    inner = hashlib.sha256()
+    outer = hashlib.sha256()
+    key = password if len(password) <= inner.block_size else hashlib.sha256(password).digest()
+    key = key.ljust(inner.block_size, b"\x00")
+    inner.update(bytes(b ^ 0x36 for b in key))
+    outer.update(bytes(b ^ 0x5C for b in key))
+
+    def prf(data: bytes) -> bytes:
+        i = inner.copy()
+        i.update(data)
+        o = outer.copy()
+        o.update(i.digest())
+        return o.digest()
+
+    blocks = []
+    for block_index in range(1, -(-dklen // inner.digest_size) + 1):
+        u = prf(salt + block_index.to_bytes(4, "big"))
+        acc = int.from_bytes(u, "big")
+        for _ in range(iterations - 1):
+            u = prf(u)
+            acc ^= int.from_bytes(u, "big")
+        blocks.append(acc.to_bytes(inner.digest_size, "big"))
+    return b"".join(blocks)[:dklen]
+
+
+def _chunk_nonce(base_nonce: bytes, index: int) -> bytes:
+    """Derive a unique nonce for a chunk by XORing its index into the base nonce"""
+    counter = int.from_bytes(base_nonce[4:], "big") ^ index
+    return base_nonce[:4] + counter.to_bytes(8, "big")
+
 
 class EncryptionService:
     """Service for encrypting and decrypting data at rest"""
@@ -18,53 +115,91 @@ class EncryptionService:
     def __init__(self):
         self._key: Optional[bytes] = None
         self._fernet: Optional[Fernet] = None
+        self._aead: Optional[AESGCM] = None
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        # Contents of the key file as of the last initialize/change_password
+        self._stored_key: Optional[bytes] = None
         self._key_file = settings.DATA_DIR / ".encryption_key"
         self._salt_file = settings.DATA_DIR / ".encryption_salt"
 
-    def _derive_key(self, password: str, salt: bytes) -> bytes:
-        """Derive encryption key from password using PBKDF2"""
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=salt,
-            iterations=480000,  # OWASP recommended minimum
-        )
-        key = base64.urlsafe_b64encode(kdf.derive(password.encode()))
+    def _new_salt(self) -> bytes:
+        """Generate salt file contents for a fresh scrypt-derived key"""
+        return bytes([_KDF_SCRYPT]) + secrets.token_bytes(_SALT_SIZE)
+
+    def _derive_key(self, password: str, salt_data: bytes) -> bytes:
+        """Derive encryption key from password using the KDF recorded with the salt"""
+        if len(salt_data) == _SALT_SIZE:
+            kdf, salt = _KDF_PBKDF2, salt_data
+        else:
+            kdf, salt = salt_data[0], salt_data[1:]
+
+        if kdf == _KDF_SCRYPT:
+            # Memory-hard; n=2**15, r=8 needs 32 MiB, so raise OpenSSL's default cap
+            derived = hashlib.scrypt(
+                password.encode(),
+                salt=salt,
+                n=2**15,
+                r=8,
+                p=1,
+                maxmem=64 * 1024 * 1024,
+                dklen=32
+            )
+        elif kdf == _KDF_PBKDF2:
+            # 480000 iterations is the OWASP recommended minimum
+            if hasattr(hashlib, "pbkdf2_hmac"):
+                derived = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, 480000, dklen=32)
+            else:
+                derived = _pbkdf2_sha256(password.encode(), salt, 480000, dklen=32)
+        else:
+            raise ValueError(f"Unknown key derivation function: {kdf}")
+
+        key = base64.urlsafe_b64encode(derived)
         return key
 
+    def _load_key(self, key: bytes):
+        """Set up ciphers for a urlsafe-base64 encoded 32 byte key"""
+        self._key = key
+        self._fernet = Fernet(key)
+        self._aead = AESGCM(base64.urlsafe_b64decode(key))
+        # Workers were initialized with the previous key
+        self.close()
+
     def initialize(self, password: Optional[str] = None) -> bool:
         """Initialize encryption with password or existing key"""
         try:
             if self._key_file.exists() and self._salt_file.exists():
                 # Load existing key
+                self._stored_key = self._key_file.read_bytes()
                 if password:
                     salt = self._salt_file.read_bytes()
                     self._key = self._derive_key(password, salt)
                 else:
                     # Use stored key (for development/auto-start)
-                    self._key = self._key_file.read_bytes()
-                self._fernet = Fernet(self._key)
+                    self._key = self._stored_key
+                self._load_key(self._key)
                 return True
             elif password:
                 # Create new key
-                salt = secrets.token_bytes(16)
+                salt = self._new_salt()
                 self._salt_file.write_bytes(salt)
                 self._key = self._derive_key(password, salt)
                 self._key_file.write_bytes(self._key)
+                self._stored_key = self._key
                 # Secure file permissions
                 os.chmod(self._key_file, 0o600)
                 os.chmod(self._salt_file, 0o600)
-                self._fernet = Fernet(self._key)
+                self._load_key(self._key)
                 return True
             else:
                 # Generate random key for first run (no password)
                 self._key = Fernet.generate_key()
                 self._key_file.write_bytes(self._key)
-                salt = secrets.token_bytes(16)
+                self._stored_key = self._key
+                salt = self._new_salt()
                 self._salt_file.write_bytes(salt)
                 os.chmod(self._key_file, 0o600)
                 os.chmod(self._salt_file, 0o600)
-                self._fernet = Fernet(self._key)
+                self._load_key(self._key)
                 return True
         except Exception as e:
             print(f"Encryption initialization failed: {e}")
@@ -72,87 +207,217 @@ class EncryptionService:
 
     def is_initialized(self) -> bool:
         """Check if encryption is initialized"""
-        return self._fernet is not None
+        return self._aead is not None
 
     def encrypt(self, data: str) -> str:
         """Encrypt a string and return base64 encoded result"""
-        if not self._fernet:
-            self.initialize()
-        if not self._fernet:
-            raise RuntimeError("Encryption not initialized")
-
-        encrypted = self._fernet.encrypt(data.encode())
-        return base64.urlsafe_b64encode(encrypted).decode()
+        encrypted = self.encrypt_bytes(data.encode())
+        return base64.urlsafe_b64encode(encrypted).decode("ascii")
 
     def decrypt(self, encrypted_data: str) -> str:
         """Decrypt base64 encoded encrypted string"""
-        if not self._fernet:
+        if not self._aead:
             self.initialize()
-        if not self._fernet:
+        if not self._aead:
             raise RuntimeError("Encryption not initialized")
 
         try:
-            encrypted = base64.urlsafe_b64decode(encrypted_data.encode())
-            decrypted = self._fernet.decrypt(encrypted)
+            # Older values are a Fernet token wrapped in a second base64
+            # layer; decrypt_bytes recognises the unwrapped token
+            encrypted = base64.urlsafe_b64decode(encrypted_data)
+            decrypted = self.decrypt_bytes(encrypted)
             return decrypted.decode()
         except Exception as e:
             raise ValueError(f"Decryption failed: {e}")
 
     def encrypt_bytes(self, data: bytes) -> bytes:
-        """Encrypt bytes"""
-        if not self._fernet:
+        """Encrypt bytes with AES-256-GCM"""
+        if not self._aead:
             self.initialize()
-        if not self._fernet:
+        if not self._aead:
             raise RuntimeError("Encryption not initialized")
 
-        return self._fernet.encrypt(data)
+        nonce = os.urandom(_NONCE_SIZE)
+        return _AEAD_VERSION + nonce + self._aead.encrypt(nonce, data, None)
 
     def decrypt_bytes(self, encrypted_data: bytes) -> bytes:
-        """Decrypt bytes"""
-        if not self._fernet:
+        """Decrypt bytes produced by encrypt_bytes (or legacy Fernet tokens)"""
+        if not self._aead:
             self.initialize()
-        if not self._fernet:
+        if not self._aead:
             raise RuntimeError("Encryption not initialized")
 
-        return self._fernet.decrypt(encrypted_data)
+        if encrypted_data[:1] != _AEAD_VERSION:
+            return self._fernet.decrypt(encrypted_data)
+
+        nonce = encrypted_data[1:1 + _NONCE_SIZE]
+        return self._aead.decrypt(nonce, encrypted_data[1 + _NONCE_SIZE:], None)
+
+    def _encrypt_stream(self, data, fd: int):
+        """Encrypt a buffer into fd one chunk at a time"""
+        header = _FILE_HEADER.pack(_FILE_MAGIC, _FILE_VERSION, _CHUNK_SIZE, os.urandom(_NONCE_SIZE))
+        base_nonce = header[-_NONCE_SIZE:]
+        os.write(fd, header)
+
+        with memoryview(data) as view:
+            total = len(view)
+            index = 0
+            offset = 0
+            while True:
+                with view[offset:offset + _CHUNK_SIZE] as chunk:
+                    offset += _CHUNK_SIZE
+                    final = offset >= total
+                    encrypted = self._aead.encrypt(
+                        _chunk_nonce(base_nonce, index), chunk, header + _RECORD_AAD.pack(index, final)
+                    )
+                # Length prefix and ciphertext go out in one syscall
+                _write_all(fd, [_RECORD_LEN.pack(len(encrypted)), encrypted])
+                if final:
+                    break
+                index += 1
+
+    def _read_record(self, src: BinaryIO, max_size: int) -> Optional[bytes]:
+        """Read one length-prefixed record, or None at end of file"""
+        prefix = src.read(_RECORD_LEN.size)
+        if not prefix:
+            return None
+        if len(prefix) < _RECORD_LEN.size:
+            raise ValueError("Encrypted file is truncated")
+        (size,) = _RECORD_LEN.unpack(prefix)
+        if size > max_size:
+            raise ValueError("Encrypted file record is too large")
+        record = src.read(size)
+        if len(record) < size:
+            raise ValueError("Encrypted file is truncated")
+        return record
+
+    def _decrypt_stream(self, header: bytes, src: BinaryIO, dst: BinaryIO):
+        """Decrypt records from src (positioned after the header) into dst"""
+        _, version, chunk_size, base_nonce = _FILE_HEADER.unpack(header)
+        if version != _FILE_VERSION:
+            raise ValueError(f"Unsupported encrypted file version: {version}")
+
+        max_size = chunk_size + _TAG_SIZE
+        index = 0
+        record = self._read_record(src, max_size)
+        if record is None:
+            # encrypt_file always writes at least one (final) record
+            raise ValueError("Encrypted file is truncated")
+        while record is not None:
+            next_record = self._read_record(src, max_size)
+            final = next_record is None
+            dst.write(self._aead.decrypt(
+                _chunk_nonce(base_nonce, index), record, header + _RECORD_AAD.pack(index, final)
+            ))
+            record = next_record
+            index += 1
 
     def encrypt_file(self, input_path: Path, output_path: Optional[Path] = None) -> Path:
-        """Encrypt a file"""
-        if not self._fernet:
+        """Encrypt a file, streaming it in fixed-size chunks"""
+        if not self._aead:
             self.initialize()
-        if not self._fernet:
+        if not self._aead:
             raise RuntimeError("Encryption not initialized")
 
         output_path = output_path or input_path.with_suffix(input_path.suffix + ".encrypted")
 
-        data = input_path.read_bytes()
-        encrypted = self._fernet.encrypt(data)
-        output_path.write_bytes(encrypted)
+        with open(input_path, "rb") as src:
+            try:
+                with open(output_path, "wb", buffering=0) as dst:
+                    # Map the input so chunks are sliced from the page cache instead
+                    # of being copied into new bytes objects (empty files can't be mapped)
+                    if os.fstat(src.fileno()).st_size:
+                        with mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                            self._encrypt_stream(data, dst.fileno())
+                    else:
+                        self._encrypt_stream(b"", dst.fileno())
+            except Exception:
+                # Don't leave a truncated encrypted file behind
+                output_path.unlink(missing_ok=True)
+                raise
 
         return output_path
 
     def decrypt_file(self, input_path: Path, output_path: Optional[Path] = None) -> Path:
         """Decrypt a file"""
-        if not self._fernet:
-            self.initialize()
-        if not self._fernet:
-            raise RuntimeError("Encryption not initialized")
-
         suffix = input_path.suffix
         if suffix == ".encrypted":
             output_path = output_path or input_path.with_suffix("")
         else:
             output_path = output_path or input_path.with_name(f"decrypted_{input_path.name}")
 
-        encrypted = input_path.read_bytes()
-        decrypted = self._fernet.decrypt(encrypted)
-        output_path.write_bytes(decrypted)
+        if not self._aead:
+            self.initialize()
+        if not self._aead:
+            raise RuntimeError("Encryption not initialized")
+
+        with open(input_path, "rb") as src:
+            if hasattr(os, "posix_fadvise"):
+                # Let the kernel read ahead aggressively (not available on macOS)
+                os.posix_fadvise(src.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+            header = src.read(_FILE_HEADER.size)
+            if len(header) < _FILE_HEADER.size or not header.startswith(_FILE_MAGIC):
+                # Whole-file blob written before streaming support
+                output_path.write_bytes(self.decrypt_bytes(input_path.read_bytes()))
+                return output_path
+
+            try:
+                with open(output_path, "wb") as dst:
+                    self._decrypt_stream(header, src, dst)
+            except Exception:
+                # Don't leave partially decrypted output behind
+                output_path.unlink(missing_ok=True)
+                raise
 
         return output_path
 
-    def hash_data(self, data: str) -> str:
-        """Create a secure hash of data"""
-        return hashlib.sha256(data.encode()).hexdigest()
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        """Lazily start the worker pool used for large files"""
+        if self._process_pool is None:
+            # Spawn rather than fork: the server is multithreaded by now, and
+            # a forked child can deadlock on locks held at fork time
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=2,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self._key,)
+            )
+        return self._process_pool
+
+    async def _run_file_op(self, worker_fn, local_fn, input_path: Path, output_path: Optional[Path]) -> Path:
+        """Run a file operation off the event loop, in a worker process for large files"""
+        if not self._aead:
+            self.initialize()
+
+        if self._aead and input_path.stat().st_size > _PROCESS_THRESHOLD:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._get_process_pool(), worker_fn, input_path, output_path
+            )
+        return await asyncio.to_thread(local_fn, input_path, output_path)
+
+    async def encrypt_file_async(self, input_path: Path, output_path: Optional[Path] = None) -> Path:
+        """Encrypt a file without blocking the event loop"""
+        return await self._run_file_op(_worker_encrypt_file, self.encrypt_file, input_path, output_path)
+
+    async def decrypt_file_async(self, input_path: Path, output_path: Optional[Path] = None) -> Path:
+        """Decrypt a file without blocking the event loop"""
+        return await self._run_file_op(_worker_decrypt_file, self.decrypt_file, input_path, output_path)
+
+    def close(self):
+        """Shut down the worker pool if one was started"""
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False)
+            self._process_pool = None
+
+    def hash_data(self, data: str, *, mode: str = "fingerprint") -> str:
+        """Hash data: BLAKE2b for content fingerprints, SHA-256 where interoperability matters"""
+        if mode == "fingerprint":
+            return hashlib.blake2b(data.encode(), digest_size=32).hexdigest()
+        if mode == "sha256":
+            return hashlib.sha256(data.encode()).hexdigest()
+        raise ValueError(f"Unknown hash mode: {mode}")
 
     def generate_token(self, length: int = 32) -> str:
         """Generate a secure random token"""
@@ -168,21 +433,22 @@ class EncryptionService:
             old_key = self._derive_key(old_password, salt)
 
             # Verify old password
-            if self._key_file.exists():
+            stored_key = self._stored_key
+            if stored_key is None and self._key_file.exists():
                 stored_key = self._key_file.read_bytes()
-                if old_key != stored_key:
-                    return False
+            if stored_key is not None and not hmac.compare_digest(old_key, stored_key):
+                return False
 
             # Generate new salt and key
-            new_salt = secrets.token_bytes(16)
+            new_salt = self._new_salt()
             new_key = self._derive_key(new_password, new_salt)
 
             # Update files
             self._salt_file.write_bytes(new_salt)
             self._key_file.write_bytes(new_key)
+            self._stored_key = new_key
 
-            self._key = new_key
-            self._fernet = Fernet(self._key)
+            self._load_key(new_key)
 
             return True
         except Exception as e:
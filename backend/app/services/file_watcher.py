@@ -1,8 +1,8 @@
 """File system watcher for auto-indexing documents"""
 import asyncio
+import time
 from pathlib import Path
-from typing import Set, Dict, Any
-from datetime import datetime
+from typing import Set, Dict, Any, Optional, Tuple
 import logging
 
 from watchdog.observers import Observer
@@ -13,38 +13,54 @@ from .document_processor import document_processor
 
 logger = logging.getLogger(__name__)
 
+# Pending events beyond this are dropped oldest-first
+_EVENT_QUEUE_SIZE = 1024
+
+# A path component starting with a dot marks a hidden file or directory
+_HIDDEN_TOKENS = ("/.", "\\.")
+
 
 class DocumentEventHandler(FileSystemEventHandler):
     """Handle file system events for document indexing"""
 
     def __init__(self, callback):
+        # Called from the watchdog thread, so it must be thread-safe
         self.callback = callback
-        self.pending_events: Dict[str, datetime] = {}
+        self.pending_events: Dict[str, int] = {}
         self.debounce_seconds = 2.0
+        self.debounce_ns = int(self.debounce_seconds * 1e9)
+        self._supported = frozenset(document_processor.SUPPORTED_EXTENSIONS)
 
     def _should_process(self, path: str) -> bool:
         """Check if file should be processed"""
-        p = Path(path)
-
         # Skip hidden files and directories
-        if any(part.startswith('.') for part in p.parts):
+        if path.startswith('.') or any(token in path for token in _HIDDEN_TOKENS):
             return False
 
         # Check supported extensions
-        if p.suffix.lower() not in document_processor.SUPPORTED_EXTENSIONS:
+        _, dot, ext = path.rpartition('.')
+        if not dot or '.' + ext.lower() not in self._supported:
             return False
 
         return True
 
     def _debounce_event(self, path: str) -> bool:
         """Debounce events to avoid processing the same file multiple times"""
-        now = datetime.now()
+        now = time.monotonic_ns()
         last_event = self.pending_events.get(path)
 
-        if last_event and (now - last_event).total_seconds() < self.debounce_seconds:
+        if last_event and now - last_event < self.debounce_ns:
             return False
 
         self.pending_events[path] = now
+
+        # Drop stale entries so the map doesn't grow with every file ever seen
+        if len(self.pending_events) > 4096:
+            cutoff = now - 10 * self.debounce_ns
+            self.pending_events = {
+                p: t for p, t in self.pending_events.items() if t >= cutoff
+            }
+
         return True
 
     def on_created(self, event: FileSystemEvent):
@@ -52,21 +68,21 @@ class DocumentEventHandler(FileSystemEventHandler):
             return
         if self._should_process(event.src_path) and self._debounce_event(event.src_path):
             logger.info(f"New file detected: {event.src_path}")
-            asyncio.create_task(self.callback("created", event.src_path))
+            self.callback("created", event.src_path)
 
     def on_modified(self, event: FileSystemEvent):
         if event.is_directory:
             return
         if self._should_process(event.src_path) and self._debounce_event(event.src_path):
             logger.info(f"File modified: {event.src_path}")
-            asyncio.create_task(self.callback("modified", event.src_path))
+            self.callback("modified", event.src_path)
 
     def on_deleted(self, event: FileSystemEvent):
         if event.is_directory:
             return
         if self._should_process(event.src_path):
             logger.info(f"File deleted: {event.src_path}")
-            asyncio.create_task(self.callback("deleted", event.src_path))
+            self.callback("deleted", event.src_path)
 
 
 class FileWatcherService:
@@ -77,6 +93,9 @@ class FileWatcherService:
         self.watched_paths: Set[str] = set()
         self._running = False
         self._index_callback = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._consumer: Optional[asyncio.Task] = None
 
     def set_index_callback(self, callback):
         """Set callback for indexing events"""
@@ -90,13 +109,38 @@ class FileWatcherService:
             except Exception as e:
                 logger.error(f"Error handling {event_type} event for {path}: {e}")
 
+    def _enqueue_event(self, event_type: str, path: str):
+        """Hand an event from the watchdog thread over to the event loop"""
+        try:
+            self._loop.call_soon_threadsafe(self._put_event, (event_type, path))
+        except RuntimeError:
+            # Loop already closed during shutdown
+            pass
+
+    def _put_event(self, item: Tuple[str, str]):
+        """Queue an event on the loop thread, dropping the oldest one when full"""
+        if self._queue.full():
+            dropped = self._queue.get_nowait()
+            logger.warning(f"File event queue full, dropping {dropped[0]} event for {dropped[1]}")
+        self._queue.put_nowait(item)
+
+    async def _consume_events(self):
+        """Process queued events one at a time"""
+        while True:
+            event_type, path = await self._queue.get()
+            await self._handle_event(event_type, path)
+
     def start(self, paths: list = None):
         """Start watching specified paths"""
         if self._running:
             return
 
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=_EVENT_QUEUE_SIZE)
+        self._consumer = self._loop.create_task(self._consume_events())
+
         self.observer = Observer()
-        handler = DocumentEventHandler(self._handle_event)
+        handler = DocumentEventHandler(self._enqueue_event)
 
         watch_paths = paths or settings.WATCH_FOLDERS
         watch_paths = [str(settings.DOCUMENTS_DIR)] + watch_paths
@@ -117,6 +161,8 @@ class FileWatcherService:
         if self.observer and self._running:
             self.observer.stop()
             self.observer.join()
+            self._consumer.cancel()
+            self._consumer = None
             self._running = False
             self.watched_paths.clear()
             logger.info("File watcher stopped")
@@ -131,7 +177,7 @@ class FileWatcherService:
             return True
 
         if self._running:
-            handler = DocumentEventHandler(self._handle_event)
+            handler = DocumentEventHandler(self._enqueue_event)
             self.observer.schedule(handler, str(path_obj), recursive=True)
             self.watched_paths.add(str(path_obj))
             logger.info(f"Added watch folder: {path_obj}")
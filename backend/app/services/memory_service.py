@@ -1,15 +1,24 @@
 """Persistent memory and knowledge management service"""
 import re
-from typing import List, Optional, Dict, Any, Tuple
+from typing import List, Optional, Dict, Any, Tuple, AsyncIterator
 from datetime import datetime
+
+import orjson
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_, and_, func
+from sqlalchemy import select, insert, or_, and_, func, literal_column, table
 
 from ..models.database import Memory, Message, Session, UserSettings
 from ..models.schemas import MemoryType, MemoryResponse, UserProfile
 from ..core.config import settings
+from ..core.database import memory_fts_enabled
 from .ollama_service import ollama_service
 
+# Patterns for parsing stored facts back into profile fields
+_NAME_RE = re.compile(r"name is (\w+)")
+_AGE_RE = re.compile(r"(\d+)")
+_LOC_RE = re.compile(r"(?:in|at) (.+)$")
+_INTEREST_RE = re.compile(r"interested in (.+)$", re.I)
+
 
 class MemoryService:
     """Service for managing persistent memory and user knowledge"""
@@ -17,26 +26,39 @@ class MemoryService:
     # Patterns for extracting facts from conversations
     FACT_PATTERNS = [
         # Personal info
-        (r"my name is (\w+)", "name", MemoryType.FACT),
-        (r"i(?:'m| am) (\d+) years? old", "age", MemoryType.FACT),
-        (r"i(?:'m| am) a ([^.]+?) (?:at|for|in)", "job", MemoryType.FACT),
-        (r"i work (?:at|for|as) ([^.]+)", "work", MemoryType.FACT),
-        (r"i live in ([^.]+)", "location", MemoryType.FACT),
-        (r"i(?:'m| am) from ([^.]+)", "origin", MemoryType.FACT),
+        (re.compile(r"my name is (\w+)"), "name", MemoryType.FACT),
+        (re.compile(r"i(?:'m| am) (\d+) years? old"), "age", MemoryType.FACT),
+        (re.compile(r"i(?:'m| am) a ([^.]+?) (?:at|for|in)"), "job", MemoryType.FACT),
+        (re.compile(r"i work (?:at|for|as) ([^.]+)"), "work", MemoryType.FACT),
+        (re.compile(r"i live in ([^.]+)"), "location", MemoryType.FACT),
+        (re.compile(r"i(?:'m| am) from ([^.]+)"), "origin", MemoryType.FACT),
 
         # Preferences
-        (r"i (?:like|love|enjoy|prefer) ([^.]+)", None, MemoryType.PREFERENCE),
-        (r"i (?:don't like|hate|dislike) ([^.]+)", None, MemoryType.PREFERENCE),
-        (r"my favorite ([^.]+) is ([^.]+)", None, MemoryType.PREFERENCE),
+        (re.compile(r"i (?:like|love|enjoy|prefer) ([^.]+)"), None, MemoryType.PREFERENCE),
+        (re.compile(r"i (?:don't like|hate|dislike) ([^.]+)"), None, MemoryType.PREFERENCE),
+        (re.compile(r"my favorite ([^.]+) is ([^.]+)"), None, MemoryType.PREFERENCE),
 
         # Topics of interest
-        (r"i(?:'m| am) (?:interested in|curious about|learning) ([^.]+)", None, MemoryType.TOPIC),
-        (r"i(?:'m| am) working on ([^.]+)", None, MemoryType.TOPIC),
+        (re.compile(r"i(?:'m| am) (?:interested in|curious about|learning) ([^.]+)"), None, MemoryType.TOPIC),
+        (re.compile(r"i(?:'m| am) working on ([^.]+)"), None, MemoryType.TOPIC),
     ]
 
     def __init__(self):
         self._user_profile: Optional[UserProfile] = None
 
+    @staticmethod
+    def _content_contains(text: str):
+        """Case-insensitive substring filter on memory content"""
+        # The trigram index only covers needles of 3+ characters
+        if memory_fts_enabled() and len(text) >= 3:
+            phrase = '"' + text.replace('"', '""') + '"'
+            return Memory.id.in_(
+                select(literal_column("id"))
+                .select_from(table("memories_fts"))
+                .where(literal_column("memories_fts").op("MATCH")(phrase))
+            )
+        return Memory.content.ilike(f"%{text}%")
+
     async def initialize_default_profile(self, db: AsyncSession):
         """Initialize with default user profile if empty"""
         # Check if we already have memories
@@ -47,68 +69,33 @@ class MemoryService:
             # Load default profile
             profile = settings.DEFAULT_USER_PROFILE
 
-            # Create memory entries for default profile
-            memories = [
-                Memory(
-                    content=f"User's name is {profile['name']}",
-                    memory_type=MemoryType.FACT,
-                    category="personal",
-                    source="initial_setup",
-                    confidence=1.0
-                ),
-                Memory(
-                    content=f"User is {profile['age']} years old",
-                    memory_type=MemoryType.FACT,
-                    category="personal",
-                    source="initial_setup",
-                    confidence=1.0
-                ),
-                Memory(
-                    content=f"User works as a {profile['job']}",
-                    memory_type=MemoryType.FACT,
-                    category="professional",
-                    source="initial_setup",
-                    confidence=1.0
-                ),
-                Memory(
-                    content=f"User is located in {profile['location']}",
-                    memory_type=MemoryType.FACT,
-                    category="personal",
-                    source="initial_setup",
-                    confidence=1.0
-                ),
-                Memory(
-                    content=f"User has a {profile['background']}",
-                    memory_type=MemoryType.FACT,
-                    category="professional",
-                    source="initial_setup",
-                    confidence=1.0
-                ),
+            # Rows for the default profile, inserted in one statement
+            def row(content: str, memory_type: MemoryType, category: str) -> Dict[str, Any]:
+                return {
+                    "content": content,
+                    "memory_type": memory_type,
+                    "category": category,
+                    "source": "initial_setup",
+                    "confidence": 1.0
+                }
+
+            rows = [
+                row(f"User's name is {profile['name']}", MemoryType.FACT, "personal"),
+                row(f"User is {profile['age']} years old", MemoryType.FACT, "personal"),
+                row(f"User works as a {profile['job']}", MemoryType.FACT, "professional"),
+                row(f"User is located in {profile['location']}", MemoryType.FACT, "personal"),
+                row(f"User has a {profile['background']}", MemoryType.FACT, "professional"),
             ]
 
             # Add interests
             for interest in profile.get('interests', []):
-                memories.append(Memory(
-                    content=f"User is interested in {interest}",
-                    memory_type=MemoryType.TOPIC,
-                    category="interests",
-                    source="initial_setup",
-                    confidence=1.0
-                ))
+                rows.append(row(f"User is interested in {interest}", MemoryType.TOPIC, "interests"))
 
             # Add preferences
             for key, value in profile.get('preferences', {}).items():
-                memories.append(Memory(
-                    content=f"User preference: {key} = {value}",
-                    memory_type=MemoryType.PREFERENCE,
-                    category="preferences",
-                    source="initial_setup",
-                    confidence=1.0
-                ))
-
-            for memory in memories:
-                db.add(memory)
+                rows.append(row(f"User preference: {key} = {value}", MemoryType.PREFERENCE, "preferences"))
 
+            await db.execute(insert(Memory), rows)
             await db.commit()
 
     async def extract_and_store_from_message(
@@ -122,37 +109,51 @@ class MemoryService:
         if role != "user":
             return []
 
-        extracted = []
         message_lower = message.lower()
 
+        # Every fact pattern needs one of these, so most chat messages can
+        # skip the regex scan entirely
+        if "i " not in message_lower and "my " not in message_lower and "i'm" not in message_lower:
+            return []
+
+        candidates = []
         for pattern, category, memory_type in self.FACT_PATTERNS:
-            matches = re.finditer(pattern, message_lower)
-            for match in matches:
-                content = match.group(0)
-
-                # Check for duplicates
-                existing = await db.execute(
-                    select(Memory).where(
-                        Memory.content.ilike(f"%{content}%"),
-                        Memory.is_deleted == False
-                    )
-                )
-                if existing.scalar_one_or_none():
-                    continue
-
-                memory = Memory(
-                    content=content.capitalize(),
-                    memory_type=memory_type,
-                    category=category or "general",
-                    source=f"Extracted from conversation",
-                    source_session_id=session_id,
-                    confidence=0.8
-                )
-                db.add(memory)
-                extracted.append(memory)
-
-        if extracted:
-            await db.commit()
+            for match in pattern.finditer(message_lower):
+                candidates.append((match.group(0), category, memory_type))
+
+        if not candidates:
+            return []
+
+        # Check all candidates for duplicates in one query
+        result = await db.execute(
+            select(Memory.content).where(
+                Memory.is_deleted == False,
+                or_(*[self._content_contains(content) for content, _, _ in candidates])
+            )
+        )
+        existing = [row.lower() for row in result.scalars().all()]
+
+        rows = []
+        for content, category, memory_type in candidates:
+            if any(content in other for other in existing):
+                continue
+            existing.append(content)
+
+            rows.append({
+                "content": content.capitalize(),
+                "memory_type": memory_type,
+                "category": category or "general",
+                "source": "Extracted from conversation",
+                "source_session_id": session_id,
+                "confidence": 0.8
+            })
+
+        if not rows:
+            return []
+
+        result = await db.scalars(insert(Memory).returning(Memory), rows)
+        extracted = list(result.all())
+        await db.commit()
 
         return extracted
 
@@ -237,11 +238,16 @@ Return ONLY valid JSON array, nothing else."""
         """Build user profile from memories"""
         result = await db.execute(
             select(Memory).where(
-                Memory.memory_type == MemoryType.FACT,
+                Memory.memory_type.in_([MemoryType.FACT, MemoryType.TOPIC, MemoryType.PREFERENCE]),
                 Memory.is_deleted == False
             ).order_by(Memory.confidence.desc())
         )
-        facts = result.scalars().all()
+        by_type: Dict[MemoryType, List[Memory]] = {
+            MemoryType.FACT: [], MemoryType.TOPIC: [], MemoryType.PREFERENCE: []
+        }
+        for memory in result.scalars():
+            by_type[memory.memory_type].append(memory)
+        facts = by_type[MemoryType.FACT]
 
         # Parse facts into profile
         profile_data = {
@@ -257,45 +263,30 @@ Return ONLY valid JSON array, nothing else."""
         for fact in facts:
             content = fact.content.lower()
             if "name is" in content:
-                match = re.search(r"name is (\w+)", content)
+                match = _NAME_RE.search(content)
                 if match:
                     profile_data["name"] = match.group(1).capitalize()
             elif "years old" in content or "is old" in content:
-                match = re.search(r"(\d+)", content)
+                match = _AGE_RE.search(content)
                 if match:
                     profile_data["age"] = int(match.group(1))
             elif "works as" in content or "job" in content:
                 profile_data["job"] = fact.content
             elif "located in" in content or "lives in" in content:
-                match = re.search(r"(?:in|at) (.+)$", content)
+                match = _LOC_RE.search(content)
                 if match:
                     profile_data["location"] = match.group(1).strip()
 
         # Get interests
-        result = await db.execute(
-            select(Memory).where(
-                Memory.memory_type == MemoryType.TOPIC,
-                Memory.is_deleted == False
-            )
-        )
-        topics = result.scalars().all()
-        for topic in topics:
-            if "interested in" in topic.content.lower():
-                match = re.search(r"interested in (.+)$", topic.content, re.I)
-                if match:
-                    profile_data["interests"].append(match.group(1).strip())
+        for topic in by_type[MemoryType.TOPIC]:
+            match = _INTEREST_RE.search(topic.content)
+            if match:
+                profile_data["interests"].append(match.group(1).strip())
             else:
                 profile_data["interests"].append(topic.content)
 
         # Get preferences
-        result = await db.execute(
-            select(Memory).where(
-                Memory.memory_type == MemoryType.PREFERENCE,
-                Memory.is_deleted == False
-            )
-        )
-        prefs = result.scalars().all()
-        for pref in prefs:
+        for pref in by_type[MemoryType.PREFERENCE]:
             profile_data["preferences"][pref.content] = True
 
         return UserProfile(**profile_data)
@@ -313,7 +304,7 @@ Return ONLY valid JSON array, nothing else."""
         stmt = select(Memory).where(Memory.is_deleted == False)
 
         if query:
-            stmt = stmt.where(Memory.content.ilike(f"%{query}%"))
+            stmt = stmt.where(self._content_contains(query))
 
         if memory_types:
             stmt = stmt.where(Memory.memory_type.in_(memory_types))
@@ -417,25 +408,41 @@ Return ONLY valid JSON array, nothing else."""
 
         return sorted(timeline, key=lambda x: x["timestamp"], reverse=True)
 
+    def _export_row(self, m: Memory) -> Dict[str, Any]:
+        """Serializable representation of a memory for export"""
+        return {
+            "id": m.id,
+            "content": m.content,
+            "type": m.memory_type.value,
+            "category": m.category,
+            "source": m.source,
+            "confidence": m.confidence,
+            "created_at": m.created_at.isoformat(),
+            "updated_at": m.updated_at.isoformat() if m.updated_at else None
+        }
+
+    async def iter_export(self, db: AsyncSession) -> AsyncIterator[Dict[str, Any]]:
+        """Yield all memories for export, streaming rows from the database in batches"""
+        stmt = (
+            select(Memory)
+            .where(Memory.is_deleted == False)
+            .order_by(Memory.confidence.desc(), Memory.created_at.desc())
+            .execution_options(yield_per=500)
+        )
+        result = await db.stream(stmt)
+        async for m in result.scalars():
+            yield self._export_row(m)
+
+    async def export_ndjson(self, db: AsyncSession) -> AsyncIterator[bytes]:
+        """Stream all memories as newline-delimited JSON"""
+        async for row in self.iter_export(db):
+            yield orjson.dumps(row, option=orjson.OPT_APPEND_NEWLINE)
+
     async def export_all(self, db: AsyncSession) -> Dict[str, Any]:
         """Export all memories as JSON"""
-        memories = await self.search(db, limit=10000)
-
         return {
             "exported_at": datetime.utcnow().isoformat(),
-            "memories": [
-                {
-                    "id": m.id,
-                    "content": m.content,
-                    "type": m.memory_type.value,
-                    "category": m.category,
-                    "source": m.source,
-                    "confidence": m.confidence,
-                    "created_at": m.created_at.isoformat(),
-                    "updated_at": m.updated_at.isoformat() if m.updated_at else None
-                }
-                for m in memories
-            ]
+            "memories": [row async for row in self.iter_export(db)]
         }
 
 
@@ -1,5 +1,6 @@
 """Smart model routing service"""
 import re
+import functools
 from typing import Tuple, Optional, List, Dict
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
@@ -9,6 +10,29 @@ from ..models.database import ModelUsageLog
 from ..core.config import settings
 from .ollama_service import ollama_service
 
+_WORD_RE = re.compile(r'\w+')
+_LITERAL_WORD_RE = re.compile(r'\\b(\w+)\\b')
+
+
+def _split_literal_patterns(task_patterns: Dict[TaskType, List[str]]):
+    """
+    Split task patterns into plain \\bword\\b literals and everything else.
+
+    Returns a map of word -> tasks it scores for, and the remaining patterns
+    per task. A \\bword\\b pattern matches exactly when the word is one of the
+    query's \\w+ tokens, so literals can be scored with dict lookups.
+    """
+    literals: Dict[str, List[TaskType]] = {}
+    residual: Dict[TaskType, List[str]] = {}
+    for task, patterns in task_patterns.items():
+        for pattern in patterns:
+            match = _LITERAL_WORD_RE.fullmatch(pattern)
+            if match:
+                literals.setdefault(match.group(1), []).append(task)
+            else:
+                residual.setdefault(task, []).append(pattern)
+    return literals, residual
+
 
 class ModelRouter:
     """
@@ -58,11 +82,17 @@ class ModelRouter:
             r'\bmain\s+ideas?\b', r'\boverview\b', r'\bbrief\b'
         ],
         TaskType.QUESTION: [
-            r'^(what|who|where|when|why|how|can|could|would|should|is|are|do|does)\b',
-            r'\?$', r'\bexplain\b', r'\btell\s+me\b', r'\bwhat\s+is\b'
+            r'\bexplain\b', r'\btell\s+me\b', r'\bwhat\s+is\b'
         ]
     }
 
+    # Queries starting with one of these words, or ending in '?', also count
+    # towards QUESTION; both are checked with string ops in analyze_query
+    QUESTION_WORDS = frozenset({
+        'what', 'who', 'where', 'when', 'why', 'how', 'can', 'could',
+        'would', 'should', 'is', 'are', 'do', 'does'
+    })
+
     # Task complexity indicators
     COMPLEXITY_INDICATORS = {
         'high': [
@@ -76,8 +106,49 @@ class ModelRouter:
         ]
     }
 
+    # Model tier per task type at normal complexity
+    TASK_MODEL_TIERS = {
+        TaskType.CHAT: 'fast',
+        TaskType.QUESTION: 'fast',
+        TaskType.CODE: 'fast',
+        TaskType.SUMMARY: 'document',
+        TaskType.DOCUMENT_ANALYSIS: 'document',
+        TaskType.RAG_QUERY: 'document',
+        TaskType.WRITING: 'quality',
+        TaskType.CREATIVE: 'quality',
+        TaskType.EMAIL: 'quality',
+        TaskType.RESUME: 'quality'
+    }
+
+    # Keyword patterns are scored by looking up the query's words; only the
+    # multi-word/anchored patterns left over go through the regex engine
+    _LITERAL_TASKS, _RESIDUAL_PATTERNS = _split_literal_patterns(TASK_PATTERNS)
+
+    # Compiled once at class creation instead of going through re's cache per search
+    _COMPILED_TASK_PATTERNS: Dict[TaskType, List[re.Pattern]] = {
+        task: [re.compile(p) for p in patterns] for task, patterns in _RESIDUAL_PATTERNS.items()
+    }
+
+    # Each task's residual patterns fused into one alternation. Most queries
+    # match none of them, so one scan per task rules those out and only tasks
+    # that hit are scored pattern by pattern (matches of a fused regex can't
+    # overlap, so counting them directly would undercount)
+    _TASK_REGEX: Dict[TaskType, re.Pattern] = {
+        task: re.compile("|".join(f"(?:{p})" for p in patterns))
+        for task, patterns in _RESIDUAL_PATTERNS.items()
+    }
+    # Both complexity levels in one scan; the named group tells which level a
+    # match belongs to. The indicators are all literal words, so the distinct
+    # words found equal the number of patterns that match.
+    _COMPLEXITY_REGEX = re.compile(
+        "(?P<high>" + "|".join(COMPLEXITY_INDICATORS['high']) + ")|"
+        "(?P<low>" + "|".join(COMPLEXITY_INDICATORS['low']) + ")"
+    )
+
     def __init__(self):
         self.user_preferences: Dict[TaskType, str] = {}
+        # settings.MODELS is fixed at startup, so the reverse lookup is built once
+        self._model_tier_by_name = {v: k for k, v in settings.MODELS.items()}
 
     def analyze_query(self, query: str) -> Tuple[TaskType, str, str]:
         """
@@ -86,15 +157,37 @@ class ModelRouter:
         Returns:
             Tuple of (TaskType, model_name, routing_reason)
         """
-        query_lower = query.lower()
+        task_type, complexity, reason = self._classify(query.lower())
+
+        # Determine model (learned preferences apply here, outside the cache)
+        model = self._select_model(task_type, complexity)
 
+        return task_type, model, reason
+
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def _classify(query_lower: str) -> Tuple[TaskType, str, str]:
+        """Determine task type, complexity and routing reason for a lowercased query"""
         # Score each task type
         scores: Dict[TaskType, int] = {task: 0 for task in TaskType}
 
-        for task_type, patterns in self.TASK_PATTERNS.items():
-            for pattern in patterns:
-                if re.search(pattern, query_lower):
-                    scores[task_type] += 1
+        for word in set(_WORD_RE.findall(query_lower)):
+            for task_type in ModelRouter._LITERAL_TASKS.get(word, ()):
+                scores[task_type] += 1
+
+        # Leading question word and trailing '?' ($ also matches before a final newline)
+        first_word = _WORD_RE.match(query_lower)
+        if first_word and first_word.group() in ModelRouter.QUESTION_WORDS:
+            scores[TaskType.QUESTION] += 1
+        if query_lower.endswith(('?', '?\n')):
+            scores[TaskType.QUESTION] += 1
+
+        for task_type, regex in ModelRouter._TASK_REGEX.items():
+            if regex.search(query_lower):
+                scores[task_type] += sum(
+                    1 for pattern in ModelRouter._COMPILED_TASK_PATTERNS[task_type]
+                    if pattern.search(query_lower)
+                )
 
         # Get the highest scoring task type
         best_task = max(scores.items(), key=lambda x: x[1])
@@ -108,10 +201,7 @@ class ModelRouter:
             reason = f"Detected {task_type.value} task based on query patterns"
 
         # Check complexity for model selection
-        complexity = self._assess_complexity(query_lower)
-
-        # Determine model
-        model = self._select_model(task_type, complexity)
+        complexity = ModelRouter._assess_complexity(query_lower)
 
         # Adjust reason based on complexity
         if complexity == 'high':
@@ -119,18 +209,18 @@ class ModelRouter:
         elif complexity == 'low' and task_type in [TaskType.WRITING, TaskType.CREATIVE]:
             reason += " - using fast model for quick draft"
 
-        return task_type, model, reason
+        return task_type, complexity, reason
 
-    def _assess_complexity(self, query: str) -> str:
+    @staticmethod
+    def _assess_complexity(query: str) -> str:
         """Assess the complexity level requested"""
-        high_score = sum(1 for p in self.COMPLEXITY_INDICATORS['high']
-                        if re.search(p, query))
-        low_score = sum(1 for p in self.COMPLEXITY_INDICATORS['low']
-                       if re.search(p, query))
+        delta = 0
+        for level, word in {(m.lastgroup, m.group()) for m in ModelRouter._COMPLEXITY_REGEX.finditer(query)}:
+            delta += 1 if level == 'high' else -1
 
-        if high_score > low_score:
+        if delta > 0:
             return 'high'
-        elif low_score > high_score:
+        elif delta < 0:
             return 'low'
         return 'normal'
 
@@ -144,21 +234,11 @@ class ModelRouter:
         if complexity == 'high':
             return settings.MODELS['quality']
 
-        # Map task types to model tiers
-        task_model_mapping = {
-            TaskType.CHAT: 'fast',
-            TaskType.QUESTION: 'fast',
-            TaskType.CODE: 'fast',
-            TaskType.SUMMARY: 'document',
-            TaskType.DOCUMENT_ANALYSIS: 'document',
-            TaskType.RAG_QUERY: 'document',
-            TaskType.WRITING: 'quality' if complexity != 'low' else 'balanced',
-            TaskType.CREATIVE: 'quality' if complexity != 'low' else 'balanced',
-            TaskType.EMAIL: 'quality',
-            TaskType.RESUME: 'quality'
-        }
+        # Quick drafts of long-form writing drop to the balanced model
+        if complexity == 'low' and task_type in (TaskType.WRITING, TaskType.CREATIVE):
+            return settings.MODELS['balanced']
 
-        tier = task_model_mapping.get(task_type, 'fast')
+        tier = self.TASK_MODEL_TIERS.get(task_type, 'fast')
         return settings.MODELS[tier]
 
     async def learn_from_override(
@@ -183,21 +263,24 @@ class ModelRouter:
 
     async def _update_preferences(self, db: AsyncSession, task_type: TaskType):
         """Update learned preferences based on usage history"""
-        # Get recent overrides for this task type
-        query = select(ModelUsageLog).where(
+        # Tally the last 10 overrides for this task type in the database
+        recent = select(ModelUsageLog.user_override_model).where(
             ModelUsageLog.task_type == task_type.value,
             ModelUsageLog.was_override == True
-        ).order_by(ModelUsageLog.created_at.desc()).limit(10)
+        ).order_by(ModelUsageLog.created_at.desc()).limit(10).subquery()
+
+        uses = func.count().label("uses")
+        query = select(
+            recent.c.user_override_model,
+            uses,
+            func.sum(func.count()).over().label("total")
+        ).group_by(recent.c.user_override_model).order_by(uses.desc()).limit(1)
 
-        result = await db.execute(query)
-        logs = result.scalars().all()
+        row = (await db.execute(query)).first()
 
-        if len(logs) >= 3:
-            # Check if user consistently uses same override model
-            override_models = [log.user_override_model for log in logs]
-            most_common = max(set(override_models), key=override_models.count)
-            if override_models.count(most_common) >= 2:
-                self.user_preferences[task_type] = most_common
+        # Check if user consistently uses same override model
+        if row and row.total >= 3 and row.uses >= 2:
+            self.user_preferences[task_type] = row.user_override_model
 
     async def record_feedback(
         self,
@@ -218,8 +301,7 @@ class ModelRouter:
 
     def get_routing_explanation(self, task_type: TaskType, model: str) -> str:
         """Get a user-friendly explanation of the routing decision"""
-        model_names = {v: k for k, v in settings.MODELS.items()}
-        tier = model_names.get(model, 'unknown')
+        tier = self._model_tier_by_name.get(model, 'unknown')
 
         explanations = {
             'fast': f"Using {model} for quick, responsive answers",
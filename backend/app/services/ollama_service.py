@@ -1,11 +1,15 @@
 """Ollama LLM integration service"""
 import httpx
 import asyncio
+import time
 from typing import AsyncGenerator, Optional, List, Dict, Any
-import json
+import orjson
 
 from ..core.config import settings
 
+# How long the installed-model list is trusted before re-querying Ollama
+_MODELS_TTL_SECONDS = 30.0
+
 
 class OllamaService:
     """Service for interacting with Ollama API"""
@@ -14,50 +18,89 @@ class OllamaService:
         self.base_url = settings.OLLAMA_HOST
         self.models = settings.MODELS
         self._available_models: List[str] = []
+        self._available_set: frozenset = frozenset()
+        self._models_cached_at: float = 0.0
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def _get_client(self) -> httpx.AsyncClient:
+        """Shared client so requests reuse keep-alive connections to Ollama"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(300.0, connect=5.0),
+                limits=httpx.Limits(max_keepalive_connections=32, max_connections=64)
+            )
+        return self._client
+
+    async def aclose(self):
+        """Close the shared client"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @staticmethod
+    async def _iter_ndjson(response: httpx.Response) -> AsyncGenerator[Dict[str, Any], None]:
+        """Parse an NDJSON stream straight from bytes, skipping the per-line str decode"""
+        buf = bytearray()
+        async for chunk in response.aiter_bytes():
+            buf.extend(chunk)
+            start = 0
+            while (end := buf.find(b"\n", start)) != -1:
+                line = bytes(buf[start:end])
+                start = end + 1
+                if line.strip():
+                    try:
+                        yield orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        pass
+            del buf[:start]
+        if buf.strip():
+            try:
+                yield orjson.loads(bytes(buf))
+            except orjson.JSONDecodeError:
+                pass
 
     async def check_health(self) -> bool:
         """Check if Ollama is running"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(f"{self.base_url}/api/tags", timeout=5.0)
-                return response.status_code == 200
+            client = await self._get_client()
+            response = await client.get("/api/tags", timeout=5.0)
+            return response.status_code == 200
         except Exception:
             return False
 
     async def list_models(self) -> List[Dict[str, Any]]:
         """List all available models in Ollama"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(f"{self.base_url}/api/tags", timeout=10.0)
-                if response.status_code == 200:
-                    data = response.json()
-                    self._available_models = [m["name"] for m in data.get("models", [])]
-                    return data.get("models", [])
+            client = await self._get_client()
+            response = await client.get("/api/tags", timeout=10.0)
+            if response.status_code == 200:
+                data = orjson.loads(response.content)
+                self._available_models = [m["name"] for m in data.get("models", [])]
+                self._available_set = frozenset(self._available_models)
+                self._models_cached_at = time.monotonic()
+                return data.get("models", [])
         except Exception as e:
             print(f"Error listing models: {e}")
         return []
 
     async def is_model_available(self, model_name: str) -> bool:
         """Check if a specific model is available"""
-        if not self._available_models:
+        if time.monotonic() - self._models_cached_at > _MODELS_TTL_SECONDS:
             await self.list_models()
-        return model_name in self._available_models
+        return model_name in self._available_set
 
     async def pull_model(self, model_name: str) -> AsyncGenerator[Dict[str, Any], None]:
         """Pull a model from Ollama registry with progress updates"""
-        async with httpx.AsyncClient(timeout=None) as client:
-            async with client.stream(
-                "POST",
-                f"{self.base_url}/api/pull",
-                json={"name": model_name},
-            ) as response:
-                async for line in response.aiter_lines():
-                    if line:
-                        try:
-                            data = json.loads(line)
-                            yield data
-                        except json.JSONDecodeError:
-                            pass
+        client = await self._get_client()
+        async with client.stream(
+            "POST",
+            "/api/pull",
+            json={"name": model_name},
+            timeout=None
+        ) as response:
+            async for data in self._iter_ndjson(response):
+                yield data
 
     async def generate(
         self,
@@ -80,13 +123,10 @@ class OllamaService:
         if options:
             payload["options"] = options
 
-        async with httpx.AsyncClient(timeout=300.0) as client:
-            response = await client.post(
-                f"{self.base_url}/api/generate",
-                json=payload
-            )
-            response.raise_for_status()
-            return response.json()
+        client = await self._get_client()
+        response = await client.post("/api/generate", json=payload)
+        response.raise_for_status()
+        return orjson.loads(response.content)
 
     async def generate_stream(
         self,
@@ -109,19 +149,15 @@ class OllamaService:
         if options:
             payload["options"] = options
 
-        async with httpx.AsyncClient(timeout=None) as client:
-            async with client.stream(
-                "POST",
-                f"{self.base_url}/api/generate",
-                json=payload
-            ) as response:
-                async for line in response.aiter_lines():
-                    if line:
-                        try:
-                            data = json.loads(line)
-                            yield data
-                        except json.JSONDecodeError:
-                            pass
+        client = await self._get_client()
+        async with client.stream(
+            "POST",
+            "/api/generate",
+            json=payload,
+            timeout=None
+        ) as response:
+            async for data in self._iter_ndjson(response):
+                yield data
 
     async def chat(
         self,
@@ -142,13 +178,10 @@ class OllamaService:
         if options:
             payload["options"] = options
 
-        async with httpx.AsyncClient(timeout=300.0) as client:
-            response = await client.post(
-                f"{self.base_url}/api/chat",
-                json=payload
-            )
-            response.raise_for_status()
-            return response.json()
+        client = await self._get_client()
+        response = await client.post("/api/chat", json=payload)
+        response.raise_for_status()
+        return orjson.loads(response.content)
 
     async def chat_stream(
         self,
@@ -168,29 +201,43 @@ class OllamaService:
         if options:
             payload["options"] = options
 
-        async with httpx.AsyncClient(timeout=None) as client:
-            async with client.stream(
-                "POST",
-                f"{self.base_url}/api/chat",
-                json=payload
-            ) as response:
-                async for line in response.aiter_lines():
-                    if line:
-                        try:
-                            data = json.loads(line)
-                            yield data
-                        except json.JSONDecodeError:
-                            pass
+        client = await self._get_client()
+        async with client.stream(
+            "POST",
+            "/api/chat",
+            json=payload,
+            timeout=None
+        ) as response:
+            async for data in self._iter_ndjson(response):
+                yield data
 
     async def embeddings(self, model: str, text: str) -> List[float]:
         """Generate embeddings for text"""
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                f"{self.base_url}/api/embeddings",
-                json={"model": model, "prompt": text}
-            )
-            response.raise_for_status()
-            return response.json().get("embedding", [])
+        client = await self._get_client()
+        response = await client.post(
+            "/api/embeddings",
+            json={"model": model, "prompt": text},
+            timeout=60.0
+        )
+        response.raise_for_status()
+        return orjson.loads(response.content).get("embedding", [])
+
+    async def embeddings_batch(self, model: str, texts: List[str]) -> List[List[float]]:
+        """
+        Generate embeddings for several texts in one request.
+        Uses /api/embed (Ollama 0.3.4+), which returns L2-normalized vectors,
+        so results aren't interchangeable with those from embeddings().
+        """
+        if not texts:
+            return []
+        client = await self._get_client()
+        response = await client.post(
+            "/api/embed",
+            json={"model": model, "input": texts},
+            timeout=60.0
+        )
+        response.raise_for_status()
+        return orjson.loads(response.content).get("embeddings", [])
 
     def get_model_for_task(self, task_key: str) -> str:
         """Get the configured model for a task type"""
@@ -1,9 +1,8 @@
 """Project and task tracking service"""
-from typing import List, Optional, Dict, Any
-from datetime import datetime
+from typing import List, Optional, Dict, Any, Tuple, AsyncGenerator
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, func, Row
 
 from ..models.database import Project, ProjectIteration
 from ..models.schemas import (
@@ -49,9 +48,13 @@ class ProjectService:
         status: Optional[ProjectStatus] = None,
         include_archived: bool = False,
         limit: int = 50
-    ) -> List[Project]:
-        """List projects"""
-        stmt = select(Project)
+    ) -> List[Row]:
+        """List projects as plain rows of the columns ProjectResponse needs"""
+        stmt = select(
+            Project.id, Project.name, Project.description, Project.status,
+            Project.requirements, Project.goals, Project.notes,
+            Project.related_documents, Project.created_at, Project.updated_at
+        )
 
         if not include_archived:
             stmt = stmt.where(Project.is_archived == False)
@@ -61,7 +64,7 @@ class ProjectService:
 
         stmt = stmt.order_by(Project.updated_at.desc()).limit(limit)
         result = await db.execute(stmt)
-        return list(result.scalars().all())
+        return list(result.all())
 
     async def update_project(
         self,
@@ -74,20 +77,10 @@ class ProjectService:
         if not project:
             return None
 
-        if data.name is not None:
-            project.name = data.name
-        if data.description is not None:
-            project.description = data.description
-        if data.status is not None:
-            project.status = data.status
-        if data.requirements is not None:
-            project.requirements = data.requirements
-        if data.goals is not None:
-            project.goals = data.goals
-        if data.notes is not None:
-            project.notes = data.notes
-
-        project.updated_at = datetime.utcnow()
+        # Explicit nulls are skipped like omitted fields, as before
+        for field, value in data.model_dump(exclude_unset=True, exclude_none=True).items():
+            setattr(project, field, value)
+
         await db.commit()
         return project
 
@@ -128,10 +121,87 @@ class ProjectService:
         include_documents: bool = True
     ) -> Dict[str, Any]:
         """Have AI iterate on a project based on user input"""
-        project = await db.get(Project, project_id)
+        project, prev_iterations = await self._get_project_with_iterations(db, project_id, limit=5)
         if not project:
             return {"error": "Project not found"}
 
+        prompt, documents_referenced = await self._build_iteration_prompt(
+            project, prev_iterations, message, include_documents
+        )
+        model = settings.MODELS['quality']
+
+        result = await ollama_service.generate(
+            model=model,
+            prompt=prompt,
+            options={"temperature": 0.7}
+        )
+
+        response = result.get('response', '')
+        iteration = await self._save_iteration(
+            db, project, message, response, model, documents_referenced
+        )
+
+        return {
+            "response": response,
+            "model_used": model,
+            "documents_referenced": documents_referenced,
+            "iteration_id": iteration.id
+        }
+
+    async def iterate_on_project_stream(
+        self,
+        db: AsyncSession,
+        project_id: str,
+        message: str,
+        include_documents: bool = True
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """Stream an AI iteration on a project, saving it once generation finishes"""
+        project, prev_iterations = await self._get_project_with_iterations(db, project_id, limit=5)
+        if not project:
+            yield {"type": "error", "error": "Project not found"}
+            return
+
+        prompt, documents_referenced = await self._build_iteration_prompt(
+            project, prev_iterations, message, include_documents
+        )
+        model = settings.MODELS['quality']
+
+        yield {
+            "type": "metadata",
+            "model_used": model,
+            "documents_referenced": documents_referenced
+        }
+
+        parts = []
+        async for chunk in ollama_service.generate_stream(
+            model=model,
+            prompt=prompt,
+            options={"temperature": 0.7}
+        ):
+            content = chunk.get('response', '')
+            if content:
+                parts.append(content)
+                yield {
+                    "type": "content",
+                    "content": content,
+                    "done": chunk.get("done", False)
+                }
+
+        response = "".join(parts)
+        iteration = await self._save_iteration(
+            db, project, message, response, model, documents_referenced
+        )
+
+        yield {"type": "done", "full_response": response, "iteration_id": iteration.id}
+
+    async def _build_iteration_prompt(
+        self,
+        project: Project,
+        prev_iterations: List[Row],
+        message: str,
+        include_documents: bool
+    ) -> Tuple[str, List[str]]:
+        """Build the iteration prompt, returning it with the documents it references"""
         # Get relevant documents if requested
         doc_context = ""
         documents_referenced = []
@@ -145,30 +215,32 @@ class ProjectService:
                 documents_referenced = docs
 
         # Build project context
+        req_block = "\n".join(map("- {}".format, project.requirements or ())) or 'No requirements defined'
+        goal_block = "\n".join(map("- {}".format, project.goals or ())) or 'No goals defined'
         project_context = f"""Project: {project.name}
 
 Description: {project.description or 'No description'}
 
 Requirements:
-{chr(10).join(f'- {r}' for r in project.requirements) if project.requirements else 'No requirements defined'}
+{req_block}
 
 Goals:
-{chr(10).join(f'- {g}' for g in project.goals) if project.goals else 'No goals defined'}
+{goal_block}
 
 Current Status: {project.status.value}
 
 Notes: {project.notes or 'No notes'}
 {doc_context}"""
 
-        # Get previous iterations for context
-        prev_iterations = await self.get_project_iterations(db, project_id, limit=5)
+        # Previous iterations for context
         iteration_context = ""
         if prev_iterations:
-            iteration_context = "\n\nPrevious discussion:\n"
+            lines = ["\n\nPrevious discussion:\n"]
             for it in prev_iterations:
-                iteration_context += f"\nUser: {it.user_message[:200]}...\n"
+                lines.append(f"\nUser: {it.user_message}...\n")
                 if it.ai_response:
-                    iteration_context += f"AI: {it.ai_response[:200]}...\n"
+                    lines.append(f"AI: {it.ai_response}...\n")
+            iteration_context = "".join(lines)
 
         prompt = f"""You are helping iterate on a project. Consider the project details, previous discussions, and the user's current input.
 
@@ -181,19 +253,20 @@ Provide helpful suggestions, identify potential issues, or help refine the requi
 
 Response:"""
 
-        model = settings.MODELS['quality']
-
-        result = await ollama_service.generate(
-            model=model,
-            prompt=prompt,
-            options={"temperature": 0.7}
-        )
-
-        response = result.get('response', '')
+        return prompt, documents_referenced
 
-        # Save iteration
+    async def _save_iteration(
+        self,
+        db: AsyncSession,
+        project: Project,
+        message: str,
+        response: str,
+        model: str,
+        documents_referenced: List[str]
+    ) -> ProjectIteration:
+        """Save an iteration and bump the project's timestamp"""
         iteration = ProjectIteration(
-            project_id=project_id,
+            project_id=project.id,
             user_message=message,
             ai_response=response,
             model_used=model,
@@ -202,15 +275,9 @@ Response:"""
         db.add(iteration)
 
         # Update project timestamp
-        project.updated_at = datetime.utcnow()
+        project.updated_at = func.now()
         await db.commit()
-
-        return {
-            "response": response,
-            "model_used": model,
-            "documents_referenced": documents_referenced,
-            "iteration_id": iteration.id
-        }
+        return iteration
 
     async def get_project_iterations(
         self,
@@ -228,6 +295,38 @@ Response:"""
         result = await db.execute(stmt)
         return list(result.scalars().all())
 
+    async def _get_project_with_iterations(
+        self,
+        db: AsyncSession,
+        project_id: str,
+        limit: int,
+        preview_chars: int = 200
+    ) -> Tuple[Optional[Project], List[Row]]:
+        """Get a project and previews of its latest iterations in one query"""
+        # Messages are cut down in SQL so full LLM responses never leave the DB
+        ranked = (
+            select(
+                ProjectIteration.project_id,
+                func.substr(ProjectIteration.user_message, 1, preview_chars).label("user_message"),
+                func.substr(ProjectIteration.ai_response, 1, preview_chars).label("ai_response"),
+                func.row_number().over(
+                    order_by=ProjectIteration.created_at.desc()
+                ).label("rank")
+            )
+            .where(ProjectIteration.project_id == project_id)
+            .subquery()
+        )
+        stmt = (
+            select(Project, ranked.c.user_message, ranked.c.ai_response)
+            .outerjoin(ranked, (ranked.c.project_id == Project.id) & (ranked.c.rank <= limit))
+            .where(Project.id == project_id)
+            .order_by(ranked.c.rank)
+        )
+        rows = (await db.execute(stmt)).all()
+        if not rows:
+            return None, []
+        return rows[0][0], [row for row in rows if row.user_message is not None]
+
     async def add_document_to_project(
         self,
         db: AsyncSession,
@@ -1,21 +1,69 @@
 """RAG (Retrieval Augmented Generation) service"""
 import os
+import re
 import hashlib
 from pathlib import Path
-from typing import List, Optional, Dict, Any, Tuple
+from typing import List, Optional, Dict, Any, Tuple, Iterable, Iterator, Union
 from datetime import datetime
 import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
 
 import chromadb
+import numpy as np
 from chromadb.config import Settings as ChromaSettings
+from chromadb.utils import embedding_functions
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, insert, delete
+from sqlalchemy.exc import IntegrityError
 
 from ..core.config import settings
-from ..models.database import Document
+from ..core.database import async_session_maker
+from ..models.database import Document, EmbeddingCache, PendingGC
 from ..models.schemas import DocumentSearchResult
 from .document_processor import document_processor
 
+# ChromaDB calls block, so they run on a small dedicated pool
+_CHROMA_WORKERS = 4
+
+# Chunk boundaries, in the order _chunk_text prefers them. The lookahead
+# keeps overlapping paragraph breaks ("\n\n\n"), matching str.rfind.
+_PARA_BREAK_RE = re.compile(r'(?=\n\n)')
+_SENTENCE_BREAK_RE = re.compile(r'[.!?][ \n]')
+_SENTENCE_PUNCTS = ('. ', '! ', '? ', '.\n', '!\n', '?\n')
+
+_COLLECTION_NAME = "nexus_documents"
+_REBUILD_COLLECTION_NAME = f"{_COLLECTION_NAME}_rebuild"
+
+# Text is encoded for hashing this many characters at a time, so large
+# documents never need a second full-size bytes copy
+_HASH_SLICE_CHARS = 1 << 20
+
+# Records copied per page when rebuilding the collection
+_REBUILD_PAGE_SIZE = 1000
+
+# Cache key for vectors from the collection's embedding function
+_CHROMA_EMBEDDING_MODEL = "chroma-default/all-MiniLM-L6-v2"
+
+# Hashes per IN (...) lookup, kept under SQLite's bound-parameter limit
+_CACHE_LOOKUP_BATCH = 500
+
+
+@functools.lru_cache(maxsize=8)
+def _native_splitter(chunk_size: int, overlap: int):
+    """Rust-backed splitter from semantic-text-splitter, or None if not installed"""
+    try:
+        from semantic_text_splitter import TextSplitter
+    except ImportError:
+        return None
+    return TextSplitter(chunk_size, overlap=overlap)
+
+
+def _load_token_encoder():
+    """cl100k_base tokenizer; raises if tiktoken or its BPE file is unavailable"""
+    import tiktoken
+    return tiktoken.get_encoding("cl100k_base")
+
 
 class RAGService:
     """Service for RAG document indexing and retrieval"""
@@ -24,31 +72,286 @@ class RAGService:
         self._client: Optional[chromadb.Client] = None
         self._collection: Optional[chromadb.Collection] = None
         self._embedding_model = "nomic-embed-text"  # Good local embedding model
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._gc_tasks: set = set()
+        self._token_encoder = None
+        self._encoder_task: Optional[asyncio.Task] = None
+        self._embedding_function = embedding_functions.DefaultEmbeddingFunction()
 
     @property
     def client(self) -> chromadb.Client:
         """Get or create ChromaDB client"""
         if self._client is None:
-            self._client = chromadb.Client(ChromaSettings(
-                is_persistent=True,
-                persist_directory=str(settings.CHROMADB_DIR),
-                anonymized_telemetry=False
-            ))
+            self._client = chromadb.PersistentClient(
+                path=str(settings.CHROMADB_DIR),
+                settings=ChromaSettings(anonymized_telemetry=False)
+            )
         return self._client
 
     @property
     def collection(self) -> chromadb.Collection:
         """Get or create the documents collection"""
         if self._collection is None:
-            self._collection = self.client.get_or_create_collection(
-                name="nexus_documents",
-                metadata={"hnsw:space": "cosine"}
-            )
+            # HNSW parameters are fixed at creation, and passing different
+            # metadata for an existing collection makes ChromaDB try to modify
+            # it, so existing collections are opened as they are
+            collection = self._get_collection_or_none(_COLLECTION_NAME)
+            if collection is None:
+                collection = self._recover_rebuild()
+            if collection is None:
+                collection = self.client.create_collection(
+                    name=_COLLECTION_NAME,
+                    metadata=self._collection_metadata(),
+                    embedding_function=self._embedding_function
+                )
+            self._collection = collection
         return self._collection
 
-    def _compute_hash(self, content: str) -> str:
-        """Compute content hash for change detection"""
-        return hashlib.sha256(content.encode()).hexdigest()
+    def _get_collection_or_none(self, name: str) -> Optional[chromadb.Collection]:
+        """Open an existing collection, or None if there is none by that name"""
+        try:
+            return self.client.get_collection(
+                name=name,
+                embedding_function=self._embedding_function
+            )
+        except Exception:
+            return None
+
+    def _recover_rebuild(self) -> Optional[chromadb.Collection]:
+        """
+        Finish a rebuild interrupted between dropping the live collection and
+        renaming its replacement. Returns the recovered collection, if any.
+        """
+        # The live collection is only dropped once the copy is complete, so
+        # a leftover copy next to a live collection is partial and is left
+        # for the next rebuild to discard
+        rebuilt = self._get_collection_or_none(_REBUILD_COLLECTION_NAME)
+        if rebuilt is None:
+            return None
+
+        rebuilt.modify(name=_COLLECTION_NAME)
+        return rebuilt
+
+    @staticmethod
+    def _collection_metadata() -> Dict[str, Any]:
+        """Index settings for new collections"""
+        return {
+            "hnsw:space": "cosine",
+            "hnsw:M": settings.HNSW_M,
+            "hnsw:construction_ef": settings.HNSW_CONSTRUCTION_EF,
+            "hnsw:search_ef": settings.HNSW_SEARCH_EF,
+            "hnsw:batch_size": settings.HNSW_BATCH_SIZE,
+            "hnsw:sync_threshold": settings.HNSW_SYNC_THRESHOLD
+        }
+
+    def _rebuild_collection_sync(self) -> int:
+        """Copy every record into a collection built with the current HNSW settings"""
+        # Opening the live collection first recovers a rebuild that was
+        # interrupted mid-swap, so any leftover here is a partial copy
+        old = self.collection
+        try:
+            self.client.delete_collection(_REBUILD_COLLECTION_NAME)
+        except Exception:
+            pass  # No leftover from an interrupted rebuild
+
+        new = self.client.create_collection(
+            name=_REBUILD_COLLECTION_NAME,
+            metadata=self._collection_metadata(),
+            embedding_function=self._embedding_function
+        )
+
+        # Stored embeddings are copied as they are, so nothing is re-embedded
+        copied = 0
+        while True:
+            page = old.get(
+                include=["embeddings", "documents", "metadatas"],
+                limit=_REBUILD_PAGE_SIZE,
+                offset=copied
+            )
+            if not page["ids"]:
+                break
+            new.add(
+                ids=page["ids"],
+                embeddings=page["embeddings"],
+                documents=page["documents"],
+                metadatas=page["metadatas"]
+            )
+            copied += len(page["ids"])
+
+        self.client.delete_collection(_COLLECTION_NAME)
+        new.modify(name=_COLLECTION_NAME)
+        self._collection = new
+        return copied
+
+    async def rebuild_collection(self) -> int:
+        """
+        Rebuild the collection with the configured HNSW parameters.
+        Meant as a one-off migration while no documents are being indexed.
+        Returns the number of chunks copied.
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            self._get_executor(), self._rebuild_collection_sync
+        )
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Get or create the ChromaDB thread pool"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=_CHROMA_WORKERS, thread_name_prefix="chroma"
+            )
+        return self._executor
+
+    async def _run_chroma(self, method: str, **kwargs) -> Any:
+        """Run a blocking collection method on the ChromaDB thread pool"""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._get_executor(),
+            functools.partial(getattr(self.collection, method), **kwargs)
+        )
+
+    async def _add_to_collection(
+        self,
+        ids: List[str],
+        documents: List[str],
+        metadatas: List[Dict[str, Any]],
+        embeddings: List[List[float]]
+    ):
+        """Run a single collection.add off the event loop"""
+        await self._run_chroma(
+            "add", ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings
+        )
+
+    async def _embed_chunks(self, db: AsyncSession, texts: List[str]) -> List[List[float]]:
+        """Embed chunk texts, reusing cached vectors for chunks seen before"""
+        hashes = [hashlib.sha256(text.encode()).hexdigest() for text in texts]
+
+        cached: Dict[str, bytes] = {}
+        unique_hashes = list(dict.fromkeys(hashes))
+        for i in range(0, len(unique_hashes), _CACHE_LOOKUP_BATCH):
+            result = await db.execute(
+                select(EmbeddingCache.hash, EmbeddingCache.vector).where(
+                    EmbeddingCache.model == _CHROMA_EMBEDDING_MODEL,
+                    EmbeddingCache.hash.in_(unique_hashes[i:i + _CACHE_LOOKUP_BATCH])
+                )
+            )
+            cached.update(result.tuples().all())
+
+        # Only chunks not embedded before go through the model, once per distinct text
+        missing = {h: text for h, text in zip(hashes, texts) if h not in cached}
+        if missing:
+            vectors = await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), self._embedding_function, list(missing.values())
+            )
+            fresh = {
+                h: np.asarray(v, dtype=np.float32).tobytes()
+                for h, v in zip(missing, vectors)
+            }
+            cached.update(fresh)
+
+            try:
+                async with db.begin_nested():
+                    await db.execute(insert(EmbeddingCache), [
+                        {"hash": h, "model": _CHROMA_EMBEDDING_MODEL, "vector": v}
+                        for h, v in fresh.items()
+                    ])
+            except IntegrityError:
+                # Another indexer cached the same chunk first; the cache is best-effort
+                pass
+
+        return [np.frombuffer(cached[h], dtype=np.float32).tolist() for h in hashes]
+
+    async def load_token_encoder(self) -> bool:
+        """Load the tokenizer off the event loop; the first load may download its BPE file"""
+        try:
+            self._token_encoder = await asyncio.to_thread(_load_token_encoder)
+        except Exception as e:
+            # Not installed, or the encoding can't be fetched while offline;
+            # left unset so a later query retries
+            print(f"Token encoder unavailable, estimating context size: {e}")
+            return False
+        return True
+
+    def _ensure_token_encoder(self):
+        """Retry loading the tokenizer in the background if it isn't loaded yet"""
+        if self._token_encoder is None and (
+            self._encoder_task is None or self._encoder_task.done()
+        ):
+            self._encoder_task = asyncio.get_running_loop().create_task(
+                self.load_token_encoder()
+            )
+
+    def _schedule_gc(self, document_id: str):
+        """Remove a deleted document's chunks from ChromaDB in the background"""
+        task = asyncio.get_running_loop().create_task(self._collect_garbage(document_id))
+        self._gc_tasks.add(task)
+        task.add_done_callback(self._gc_tasks.discard)
+
+    async def _collect_garbage(self, document_id: str):
+        """Delete a document's chunks, then clear its pending_gc row"""
+        try:
+            await self._run_chroma("delete", where={"document_id": document_id})
+            async with async_session_maker() as db:
+                await db.execute(delete(PendingGC).where(PendingGC.document_id == document_id))
+                await db.commit()
+        except Exception as e:
+            # The pending_gc row stays behind and is retried on next startup
+            print(f"Error removing chunks for document {document_id}: {e}")
+
+    async def collect_pending_garbage(self, db: AsyncSession) -> int:
+        """Retry chunk deletes left unfinished by a previous run"""
+        result = await db.execute(select(PendingGC.document_id))
+        document_ids = result.scalars().all()
+        for document_id in document_ids:
+            self._schedule_gc(document_id)
+        return len(document_ids)
+
+    def close(self):
+        """Stop background tasks and the ChromaDB thread pool"""
+        if self._encoder_task is not None:
+            self._encoder_task.cancel()
+            self._encoder_task = None
+        for task in self._gc_tasks:
+            task.cancel()
+        self._gc_tasks.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    @staticmethod
+    def _iter_slices(text: str) -> Iterator[str]:
+        """Yield text in fixed-size slices"""
+        for i in range(0, len(text), _HASH_SLICE_CHARS):
+            yield text[i:i + _HASH_SLICE_CHARS]
+
+    def _compute_hash(self, content: Union[str, Iterable[str]]) -> str:
+        """Compute content hash for change detection, one piece at a time"""
+        return self._hash_with_size(content)[0]
+
+    def _hash_with_size(self, content: Union[str, Iterable[str]]) -> Tuple[str, int]:
+        """Compute the content hash and UTF-8 byte size in one pass"""
+        pieces = self._iter_slices(content) if isinstance(content, str) else content
+        h = hashlib.sha256()
+        size = 0
+        for piece in pieces:
+            data = piece.encode()
+            h.update(data)
+            size += len(data)
+        return h.hexdigest(), size
+
+    @staticmethod
+    def _compute_file_hash(path: Path) -> str:
+        """Hash a file's raw bytes"""
+        with open(path, 'rb') as f:
+            return hashlib.file_digest(f, 'sha256').hexdigest()
+
+    async def _find_by_hash(self, db: AsyncSession, content_hash: str) -> Optional[Document]:
+        """Find a live document already indexed with this hash"""
+        result = await db.execute(
+            select(Document).where(
+                Document.content_hash == content_hash,
+                Document.is_deleted == False
+            ).limit(1)
+        )
+        return result.scalar_one_or_none()
 
     def _chunk_text(
         self,
@@ -63,6 +366,26 @@ class RAGService:
         chunk_size = chunk_size or settings.CHUNK_SIZE
         overlap = overlap or settings.CHUNK_OVERLAP
 
+        splitter = _native_splitter(chunk_size, overlap)
+        if splitter is not None:
+            return self._locate_chunks(text, splitter.chunks(text))
+
+        # Every boundary position, found in one pass per pattern up front
+        para_breaks = np.fromiter(
+            (m.start() for m in _PARA_BREAK_RE.finditer(text)), dtype=np.int64
+        )
+        sentence_positions: Dict[str, List[int]] = {punct: [] for punct in _SENTENCE_PUNCTS}
+        for m in _SENTENCE_BREAK_RE.finditer(text):
+            sentence_positions[m.group()].append(m.start())
+        sentence_breaks = [
+            np.array(sentence_positions[punct], dtype=np.int64) for punct in _SENTENCE_PUNCTS
+        ]
+
+        def last_break(breaks: np.ndarray, end: int) -> int:
+            """Rightmost two-char break that fits before end, like text.rfind(..., start, end)"""
+            i = int(np.searchsorted(breaks, end - 2, side='right')) - 1
+            return int(breaks[i]) if i >= 0 else -1
+
         chunks = []
         start = 0
         text_len = len(text)
@@ -73,15 +396,15 @@ class RAGService:
             # Try to break at sentence or paragraph boundary
             if end < text_len:
                 # Look for paragraph break
-                para_break = text.rfind('\n\n', start, end)
+                para_break = last_break(para_breaks, end)
                 if para_break > start + chunk_size // 2:
                     end = para_break + 2
                 else:
                     # Look for sentence break
-                    for punct in ['. ', '! ', '? ', '.\n', '!\n', '?\n']:
-                        sent_break = text.rfind(punct, start, end)
+                    for breaks in sentence_breaks:
+                        sent_break = last_break(breaks, end)
                         if sent_break > start + chunk_size // 2:
-                            end = sent_break + len(punct)
+                            end = sent_break + 2
                             break
 
             chunk = text[start:end].strip()
@@ -92,6 +415,20 @@ class RAGService:
 
         return chunks
 
+    @staticmethod
+    def _locate_chunks(text: str, pieces: List[str]) -> List[Tuple[str, int, int]]:
+        """Recover (chunk_text, start_pos, end_pos) for splitter output in one forward pass"""
+        chunks = []
+        search_from = 0
+        for piece in pieces:
+            start = text.find(piece, search_from)
+            if start == -1:
+                start = search_from
+            chunks.append((piece, start, start + len(piece)))
+            # Overlapping chunks start before the previous one ends
+            search_from = start + 1
+        return chunks
+
     async def index_document(
         self,
         db: AsyncSession,
@@ -112,6 +449,12 @@ class RAGService:
             if not path.exists():
                 raise FileNotFoundError(f"File not found: {file_path}")
 
+            # Hash the raw file first so unchanged files skip text extraction
+            content_hash = await asyncio.to_thread(self._compute_file_hash, path)
+            existing = await self._find_by_hash(db, content_hash)
+            if existing:
+                return existing
+
             # Extract content and metadata
             doc_data = await document_processor.process_file(path)
             content = doc_data['content']
@@ -124,18 +467,12 @@ class RAGService:
                 raise ValueError("Either file_path or content must be provided")
             title = title or "Untitled Document"
             file_type = "text"
-            size_bytes = len(content.encode())
-
-        # Compute content hash
-        content_hash = self._compute_hash(content)
+            # Size comes out of the hashing pass instead of a separate encode
+            content_hash, size_bytes = self._hash_with_size(content)
 
-        # Check if document already exists with same hash
-        existing = await db.execute(
-            select(Document).where(Document.content_hash == content_hash)
-        )
-        if existing.scalar_one_or_none():
-            # Document already indexed, return existing
-            return existing.scalar_one()
+            existing = await self._find_by_hash(db, content_hash)
+            if existing:
+                return existing
 
         # Create document record
         doc = Document(
@@ -157,6 +494,8 @@ class RAGService:
 
         # Prepare for ChromaDB
         ids = [f"{doc.id}_chunk_{i}" for i in range(len(chunks))]
+        # One boolean key per tag so tag filters are plain equality matches
+        tag_keys = {f"tag_{tag}": True for tag in tags}
         documents = [chunk[0] for chunk in chunks]
         metadatas = [
             {
@@ -167,17 +506,16 @@ class RAGService:
                 "end_pos": chunk[2],
                 "file_type": file_type,
                 "file_path": file_path or "",
-                "tags": ",".join(tags)
+                "tags": ",".join(tags),
+                **tag_keys
             }
             for i, chunk in enumerate(chunks)
         ]
 
         # Add to ChromaDB
-        self.collection.add(
-            ids=ids,
-            documents=documents,
-            metadatas=metadatas
-        )
+        if ids:
+            embeddings = await self._embed_chunks(db, documents)
+            await self._add_to_collection(ids, documents, metadatas, embeddings)
 
         doc.indexed_at = datetime.utcnow()
         await db.commit()
@@ -193,6 +531,27 @@ class RAGService:
         document_ids: List[str] = None
     ) -> List[DocumentSearchResult]:
         """Search for relevant documents"""
+        results = await self.search_many(
+            [query],
+            top_k=top_k,
+            filter_tags=filter_tags,
+            file_types=file_types,
+            document_ids=document_ids
+        )
+        return results[0]
+
+    async def search_many(
+        self,
+        queries: List[str],
+        top_k: int = None,
+        filter_tags: List[str] = None,
+        file_types: List[str] = None,
+        document_ids: List[str] = None
+    ) -> List[List[DocumentSearchResult]]:
+        """Search for several queries in one ChromaDB call, returning results per query"""
+        if not queries:
+            return []
+
         top_k = top_k or settings.TOP_K_RESULTS
 
         # Build where clause
@@ -200,9 +559,9 @@ class RAGService:
         where_conditions = []
 
         if filter_tags:
-            # ChromaDB doesn't support array contains, so we use string matching
+            # Each tag is stored as its own tag_<name> key
             for tag in filter_tags:
-                where_conditions.append({"tags": {"$contains": tag}})
+                where_conditions.append({f"tag_{tag}": True})
 
         if file_types:
             where_conditions.append({"file_type": {"$in": file_types}})
@@ -216,27 +575,31 @@ class RAGService:
             where = {"$and": where_conditions}
 
         # Query ChromaDB
-        results = self.collection.query(
-            query_texts=[query],
+        results = await self._run_chroma(
+            "query",
+            query_texts=queries,
             n_results=top_k,
             where=where,
             include=["documents", "metadatas", "distances"]
         )
 
-        # Format results
-        search_results = []
-        if results['ids'] and results['ids'][0]:
-            for i, chunk_id in enumerate(results['ids'][0]):
-                metadata = results['metadatas'][0][i]
-                search_results.append(DocumentSearchResult(
-                    document_id=metadata['document_id'],
-                    title=metadata['title'],
-                    chunk_content=results['documents'][0][i],
-                    relevance_score=1 - results['distances'][0][i],  # Convert distance to similarity
-                    metadata=metadata
-                ))
-
-        return search_results
+        # Format results, one list per query
+        all_results = []
+        for q in range(len(queries)):
+            search_results = []
+            if results['ids'] and q < len(results['ids']):
+                for i, chunk_id in enumerate(results['ids'][q]):
+                    metadata = results['metadatas'][q][i]
+                    search_results.append(DocumentSearchResult(
+                        document_id=metadata['document_id'],
+                        title=metadata['title'],
+                        chunk_content=results['documents'][q][i],
+                        relevance_score=1 - results['distances'][q][i],  # Convert distance to similarity
+                        metadata=metadata
+                    ))
+            all_results.append(search_results)
+
+        return all_results
 
     async def get_context_for_query(
         self,
@@ -253,20 +616,30 @@ class RAGService:
         if not results:
             return "", []
 
+        # Count tokens with tiktoken; fall back to a rough 4-chars-per-token
+        # estimate until the encoder has loaded
+        encoder = self._token_encoder
+        if encoder is not None:
+            token_counts = [
+                len(encoder.encode(result.chunk_content, disallowed_special=()))
+                for result in results
+            ]
+        else:
+            self._ensure_token_encoder()
+            token_counts = [len(result.chunk_content) // 4 for result in results]
+
         context_parts = []
-        documents_used = set()
+        documents_used: Dict[str, None] = {}  # ordered set, keeps ranking order
         current_tokens = 0
 
-        for result in results:
-            # Rough token estimate (4 chars per token)
-            chunk_tokens = len(result.chunk_content) // 4
+        for result, chunk_tokens in zip(results, token_counts):
             if current_tokens + chunk_tokens > max_tokens:
                 break
 
             context_parts.append(
                 f"[From: {result.title}]\n{result.chunk_content}"
             )
-            documents_used.add(result.title)
+            documents_used[result.title] = None
             current_tokens += chunk_tokens
 
         context = "\n\n---\n\n".join(context_parts)
@@ -274,17 +647,13 @@ class RAGService:
 
     async def delete_document(self, db: AsyncSession, document_id: str):
         """Delete a document and its chunks"""
-        # Delete from ChromaDB
-        # Get all chunk IDs for this document
-        self.collection.delete(
-            where={"document_id": document_id}
-        )
-
-        # Mark as deleted in database
+        # Mark as deleted in database; the chunks are removed in the background
         doc = await db.get(Document, document_id)
         if doc:
             doc.is_deleted = True
+            await db.merge(PendingGC(document_id=document_id))
             await db.commit()
+            self._schedule_gc(document_id)
 
     async def reindex_document(
         self,
@@ -296,23 +665,27 @@ class RAGService:
         if not doc or not doc.file_path:
             return None
 
-        # Delete old chunks
-        self.collection.delete(
-            where={"document_id": document_id}
-        )
+        # Retire the old record so the duplicate check doesn't return it.
+        # Its chunks are keyed by the old id, so they can be removed in the
+        # background without touching the new ones.
+        doc.is_deleted = True
+        await db.merge(PendingGC(document_id=document_id))
+        await db.flush()
 
         # Reindex
-        return await self.index_document(
+        new_doc = await self.index_document(
             db,
             file_path=doc.file_path,
             title=doc.title,
             tags=doc.tags
         )
+        self._schedule_gc(document_id)
+        return new_doc
 
-    def get_stats(self) -> Dict[str, Any]:
+    async def get_stats(self) -> Dict[str, Any]:
         """Get RAG system statistics"""
         return {
-            "total_chunks": self.collection.count(),
+            "total_chunks": await self._run_chroma("count"),
             "persist_directory": str(settings.CHROMADB_DIR)
         }
 
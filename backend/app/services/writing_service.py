@@ -1,4 +1,5 @@
 """Writing studio service for drafting emails, resumes, and creative content"""
+import asyncio
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 
@@ -157,21 +158,20 @@ Provide the written content:"""
         # Use quality model for writing tasks
         model = settings.MODELS['quality']
 
-        drafts = []
-        for i in range(num_drafts):
-            # Vary temperature slightly for different drafts
-            temperature = 0.7 + (i * 0.1)
-
-            result = await ollama_service.generate(
+        # Drafts are independent, so generate them concurrently
+        # (temperature varies slightly for different drafts)
+        results = await asyncio.gather(*(
+            ollama_service.generate(
                 model=model,
                 prompt=prompt,
-                options={"temperature": temperature}
+                options={"temperature": 0.7 + (i * 0.1)}
             )
+            for i in range(num_drafts)
+        ))
+        drafts = [result.get('response', '') for result in results]
 
-            draft_content = result.get('response', '')
-            drafts.append(draft_content)
-
-            # Save draft to database
+        # Save drafts to database
+        for i, draft_content in enumerate(drafts):
             draft = WritingDraft(
                 mode=request.mode,
                 input_text=request.input_text,
@@ -293,15 +293,16 @@ Draft email response:"""
 
         model = settings.MODELS['quality']
 
-        # Generate two variations
-        drafts = []
-        for temp in [0.6, 0.8]:
-            result = await ollama_service.generate(
+        # Generate two variations concurrently
+        results = await asyncio.gather(*(
+            ollama_service.generate(
                 model=model,
                 prompt=prompt,
                 options={"temperature": temp}
             )
-            drafts.append(result.get('response', ''))
+            for temp in (0.6, 0.8)
+        ))
+        drafts = [result.get('response', '') for result in results]
 
         return WritingResponse(
             drafts=drafts,
@@ -238,12 +238,15 @@ export async function getMemoryTimeline(
   return data;
 }
 
-export async function exportMemories(): Promise<{
-  exported_at: string;
-  memories: Memory[];
-}> {
-  const { data } = await api.get("/memory/export");
-  return data;
+export async function exportMemories(): Promise<Memory[]> {
+  // Streamed as newline-delimited JSON, one memory per line
+  const { data } = await api.get<string>("/memory/export", {
+    responseType: "text",
+  });
+  return data
+    .split("\n")
+    .filter(Boolean)
+    .map((line) => JSON.parse(line));
 }
 
 // === Projects API ===